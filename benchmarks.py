@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Coroutine, TypeVar
+
+from jsonschema import validate
+
+from diablo_elixir_alerter import DiabloElixirAlerter
+from diablo_events import EVENTS_SCHEMA, DiabloBossEvent, DiabloEvents, DiabloHelltideEvent, DiabloLegionEvent, EventsClient, decode_diablo_events
+from diablo_events_alerter import diablo_events_to_alerts, format_event_time_till
+from fakes import OPUS_FRAME_DURATION, FakeDeployment, StubEventsServer, first_frame_latencies, voice_state_update
+from introducer import INTRO_DEBOUNCE_WINDOW, IntroducerCog
+
+T = TypeVar( 'T' )
+
+PERCENTILES = ( 50, 90, 99 )
+DRAIN_POLL_INTERVAL = 0.05
+ELIXIR_DRAIN_TIMEOUT = 30.0
+
+SAMPLE_EVENTS_BODY = json.dumps( {
+    'boss': {
+        'name': 'Ashava',
+        'expectedName': 'Avarice',
+        'nextExpectedName': 'Wandering Death',
+        'timestamp': 1690000000,
+        'expected': 1690020000,
+        'nextExpected': 1690040000,
+        'territory': 'Fractured Peaks',
+        'zone': 'Desolate Highlands',
+    },
+    'legion': {
+        'timestamp': 1690000000,
+        'expected': 1690001800,
+        'nextExpected': 1690003600,
+        'territory': 'Dry Steppes',
+        'zone': 'Khargai Crags',
+    },
+    'helltide': {
+        'timestamp': 1690000000,
+        'zone': 'kehj',
+        'refresh': 0,
+    },
+} ).encode( 'utf-8' )
+
+def _legacy_decode_diablo_events( body: bytes ) -> object:
+    data = json.loads( body )
+
+    # Mirrors the original per-poll path: the schema is re-checked and a validator rebuilt every call
+    validate( data, EVENTS_SCHEMA )
+
+    return (
+        DiabloBossEvent( **data[ 'boss' ] ),
+        DiabloLegionEvent( **data[ 'legion' ] ),
+        DiabloHelltideEvent( **data[ 'helltide' ] ),
+    )
+
+def _time_per_call( func: Callable[ [], object ], iterations: int, repeats: int ) -> list[ float ]:
+    timings: list[ float ] = []
+    for _ in range( repeats ):
+        start = time.perf_counter()
+        for _ in range( iterations ):
+            func()
+        timings.append( ( time.perf_counter() - start ) / iterations )
+    return timings
+
+def _print_timings( name: str, timings: list[ float ] ):
+    print( f'{name:<24} median={statistics.median( timings ) * 1e6:9.2f}us  min={min( timings ) * 1e6:9.2f}us' )
+
+def benchmark_decode( iterations: int, repeats: int ):
+    decoded = decode_diablo_events( SAMPLE_EVENTS_BODY )
+    assert isinstance( decoded, DiabloEvents )
+
+    legacy = _time_per_call( lambda: _legacy_decode_diablo_events( SAMPLE_EVENTS_BODY ), iterations, repeats )
+    current = _time_per_call( lambda: decode_diablo_events( SAMPLE_EVENTS_BODY ), iterations, repeats )
+
+    _print_timings( 'legacy validate+splat', legacy )
+    _print_timings( 'decode_diablo_events', current )
+    print( f'speedup: {statistics.median( legacy ) / statistics.median( current ):.1f}x' )
+
+def _time_each( func: Callable[ [], object ], iterations: int ) -> list[ float ]:
+    timings: list[ float ] = []
+    for _ in range( iterations ):
+        start = time.perf_counter()
+        func()
+        timings.append( time.perf_counter() - start )
+    return timings
+
+def percentile( sorted_values: list[ float ], percentile: float ) -> float:
+    index = min( len( sorted_values ) - 1, max( 0, round( percentile / 100 * len( sorted_values ) ) - 1 ) )
+    return sorted_values[ index ]
+
+def print_latencies( name: str, latencies: list[ float ], elapsed: float, unit: str = 'ms' ):
+    scale = 1e3 if unit == 'ms' else 1e6
+    if not latencies:
+        print( f'{name:<24} no samples' )
+        return
+
+    values = sorted( latencies )
+    percentiles = '  '.join( f'p{p}={percentile( values, p ) * scale:9.2f}{unit}' for p in PERCENTILES )
+    print( f'{name:<24} n={len( values ):<7} {len( values ) / elapsed:10.1f}/s  {percentiles}  max={values[ -1 ] * scale:9.2f}{unit}' )
+
+def _run_with_allocations( func: Callable[ [], T ], enabled: bool, limit: int = 10 ) -> T:
+    if not enabled:
+        return func()
+
+    tracemalloc.start( 10 )
+    try:
+        result = func()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces( (
+        tracemalloc.Filter( False, tracemalloc.__file__ ),
+        tracemalloc.Filter( False, '<frozen importlib._bootstrap*>' ),
+    ) )
+    stats = snapshot.statistics( 'lineno' )
+
+    print( f'allocations: peak={peak / 1024:.1f}KiB retained={sum( s.size for s in stats ) / 1024:.1f}KiB (timings above were measured under tracemalloc)' )
+    for stat in stats[ :limit ]:
+        frame = stat.traceback[ 0 ]
+        print( f'  {stat.size / 1024:9.1f}KiB {stat.count:7} blocks  {frame.filename}:{frame.lineno}' )
+
+    return result
+
+def _run_async( coro: Coroutine[ Any, Any, T ] ) -> T:
+    return asyncio.run( coro )
+
+def _member_name( index: int ) -> str:
+    letters = ''
+    while True:
+        index, remainder = divmod( index, 26 )
+        letters = chr( ord( 'a' ) + remainder ) + letters
+        if index == 0:
+            return f'Member {letters}'
+        index -= 1
+
+def _create_deployment( root_dir: Path, guilds: int, members: int, frame_interval: float ) -> FakeDeployment:
+    deployment = FakeDeployment( root_dir, frame_interval=frame_interval )
+    for g in range( guilds ):
+        guild = deployment.bot.add_guild( f'Guild {g}', frame_interval=frame_interval )
+        deployment.channels.append( guild.create_voice_channel( 'diablo4-party-channel' ) )
+        for m in range( members ):
+            guild.add_member( _member_name( m ) )
+    return deployment
+
+async def _benchmark_intros( guilds: int, members: int, rate: float, duration: float, frame_interval: float, debounce: float, prewarm: bool, seed: int ):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        deployment = _create_deployment( Path( tmp_dir ), guilds, members, frame_interval )
+        await deployment.register_channels()
+
+        cog = IntroducerCog(
+            deployment.bot.as_bot(),
+            deployment.registry,
+            deployment.tts,
+            deployment.sound_cache,
+            deployment.intro_sounds,
+            deployment.welcome_sounds,
+            deployment.voice_connections,
+            deployment.playback,
+            debounce_window=debounce,
+        )
+
+        if prewarm:
+            start = time.perf_counter()
+            await cog.on_ready()
+            await cog.prewarm_queue.join()
+            print( f'pre-warmed {cog.prewarmed_sounds} sound(s) in {time.perf_counter() - start:.2f}s' )
+
+        rng = random.Random( seed )
+        joins: dict[ int, list[ float ] ] = {}
+        dispatch_times: list[ float ] = []
+
+        event_count = max( 1, int( rate * duration ) )
+        start = time.perf_counter()
+        for i in range( event_count ):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep( delay )
+
+            channel = rng.choice( deployment.channels )
+            guild = channel.fake_guild
+            member = rng.choice( guild.members )
+            before, after = guild.move_member( member, None if member.voice else channel )
+
+            dispatch_start = time.perf_counter()
+            if after.channel is not None:
+                joins.setdefault( channel.id, [] ).append( dispatch_start )
+            await cog.on_voice_state_update( *voice_state_update( member, before, after ) )
+            dispatch_times.append( time.perf_counter() - dispatch_start )
+
+        while cog.intro_tasks or deployment.playback.queue_depth() > 0 or deployment.is_playing():
+            await asyncio.sleep( DRAIN_POLL_INTERVAL )
+        elapsed = time.perf_counter() - start
+
+        latencies: list[ float ] = []
+        skipped = 0
+        for channel in deployment.channels:
+            guild = channel.fake_guild
+            channel_latencies, channel_skipped = first_frame_latencies( joins.get( channel.id, [] ), guild.first_frame_times( channel.id ) )
+            latencies.extend( channel_latencies )
+            skipped += channel_skipped
+
+        await cog.cog_unload()
+
+    print_latencies( 'on_voice_state_update', dispatch_times, elapsed, unit='us' )
+    print_latencies( 'join -> first frame', latencies, elapsed )
+    print( f'events={event_count} joins={sum( len( j ) for j in joins.values() )} unintroduced={skipped} elapsed={elapsed:.2f}s' )
+    print( f'playback: discarded={deployment.playback.discarded} preempted={deployment.playback.preempted} sound cache hits={deployment.sound_cache.hits} misses={deployment.sound_cache.misses}' )
+
+async def _benchmark_elixir( guilds: int, members: int, iterations: int, interval: float, frame_interval: float ):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        deployment = _create_deployment( Path( tmp_dir ), guilds, members, frame_interval )
+        await deployment.register_channels()
+
+        cog = DiabloElixirAlerter(
+            deployment.bot.as_bot(),
+            deployment.registry,
+            deployment.sound_cache,
+            deployment.voice_connections,
+            deployment.playback,
+            after_join_delay=timedelta( seconds=interval ),
+            alert_interval=timedelta( seconds=interval ),
+        )
+        cog.alert_lateness = deque()
+
+        start = time.perf_counter()
+        for channel in deployment.channels:
+            member = channel.fake_guild.members[ 0 ]
+            before, after = channel.fake_guild.move_member( member, channel )
+            await cog.on_voice_state_update( *voice_state_update( member, before, after ) )
+
+        expected_alerts = iterations * len( deployment.channels )
+        deadline = start + ( iterations + 1 ) * interval + ELIXIR_DRAIN_TIMEOUT
+        while len( cog.alert_lateness ) < expected_alerts and time.perf_counter() < deadline:
+            await asyncio.sleep( DRAIN_POLL_INTERVAL )
+        elapsed = time.perf_counter() - start
+
+        await cog.cog_unload()
+
+    print_latencies( 'elixir alert lateness', [ l.total_seconds() for l in cog.alert_lateness ], elapsed )
+    print( f'alerts={len( cog.alert_lateness )}/{expected_alerts} reused connections={deployment.voice_connections.reused_connections} sound cache hits={deployment.sound_cache.hits} misses={deployment.sound_cache.misses}' )
+
+def benchmark_event_alerts( iterations: int ):
+    events = decode_diablo_events( SAMPLE_EVENTS_BODY )
+    base_time = datetime.fromtimestamp( events.boss.timestamp, tz=timezone.utc )
+
+    rng = random.Random( 0 )
+    nows = [ base_time + timedelta( seconds=rng.uniform( 0, 4 * 60 * 60 ) ) for _ in range( iterations ) ]
+    now_iter = iter( nows )
+
+    def to_alerts():
+        now = next( now_iter )
+        diablo_events_to_alerts( now, now - timedelta( minutes=1 ), events, all_intervals=True )
+
+    start = time.perf_counter()
+    timings = _time_each( to_alerts, iterations )
+    print_latencies( 'diablo_events_to_alerts', timings, time.perf_counter() - start, unit='us' )
+
+    time_tills = [ timedelta( seconds=rng.uniform( 0, 4 * 60 * 60 ) ) for _ in range( iterations ) ]
+    time_till_iter = iter( time_tills )
+
+    start = time.perf_counter()
+    timings = _time_each( lambda: format_event_time_till( next( time_till_iter ) ), iterations )
+    print_latencies( 'format_event_time_till', timings, time.perf_counter() - start, unit='us' )
+
+async def _time_events_polls( client: EventsClient, iterations: int, expected_result: str, before_poll: Callable[ [ int ], None ] | None = None ) -> list[ float ]:
+    timings: list[ float ] = []
+    for i in range( iterations ):
+        if before_poll is not None:
+            before_poll( i )
+
+        start = time.perf_counter()
+        await client.get_events()
+        timings.append( time.perf_counter() - start )
+
+        assert client.last_result == expected_result, f'expected {expected_result} poll, got {client.last_result}'
+    return timings
+
+async def _benchmark_events_client( iterations: int ):
+    stub = StubEventsServer()
+    stub.set_body( SAMPLE_EVENTS_BODY )
+    await stub.start()
+
+    client = EventsClient( stub.url )
+    try:
+        start = time.perf_counter()
+        timings = await _time_events_polls( client, 1, 'ok' )
+        print_latencies( 'first poll', timings, time.perf_counter() - start )
+        assert 'If-None-Match' not in stub.request_headers[ -1 ] and 'If-Modified-Since' not in stub.request_headers[ -1 ]
+
+        start = time.perf_counter()
+        timings = await _time_events_polls( client, iterations, 'not_modified' )
+        print_latencies( 'not modified polls', timings, time.perf_counter() - start )
+        assert stub.request_headers[ -1 ].get( 'If-None-Match' ) == stub.etag
+        assert stub.request_headers[ -1 ].get( 'If-Modified-Since' ) == stub.last_modified
+
+        def new_etag( i: int ):
+            stub.set_body( SAMPLE_EVENTS_BODY, etag=f'"unchanged-{i}"' )
+
+        start = time.perf_counter()
+        timings = await _time_events_polls( client, iterations, 'unchanged', new_etag )
+        print_latencies( 'unchanged body polls', timings, time.perf_counter() - start )
+        assert client.etag == stub.etag
+
+        stub.set_body( SAMPLE_EVENTS_BODY.replace( b'Ashava', b'Avarice' ) )
+        start = time.perf_counter()
+        timings = await _time_events_polls( client, 1, 'ok' )
+        print_latencies( 'changed body poll', timings, time.perf_counter() - start )
+        assert client.events is not None and client.events.boss.name == 'Avarice'
+    finally:
+        await client.close()
+        await stub.stop()
+
+    stats = client.stats
+    print( f'requests={stats.requests} not_modified={stats.not_modified} failures={stats.failures} bytes_received={stats.bytes_received}' )
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers( dest='benchmark', required=True )
+
+    decode_parser = subparsers.add_parser( 'decode' )
+    decode_parser.add_argument( '--iterations', type=int, default=2000 )
+    decode_parser.add_argument( '--repeats', type=int, default=5 )
+
+    intros_parser = subparsers.add_parser( 'intros' )
+    intros_parser.add_argument( '--guilds', type=int, default=10 )
+    intros_parser.add_argument( '--members', type=int, default=20 )
+    intros_parser.add_argument( '--rate', type=float, default=20, help='voice state events per second across all guilds' )
+    intros_parser.add_argument( '--duration', type=float, default=10, help='seconds of events to generate' )
+    intros_parser.add_argument( '--debounce', type=float, default=INTRO_DEBOUNCE_WINDOW )
+    intros_parser.add_argument( '--prewarm', action='store_true' )
+    intros_parser.add_argument( '--seed', type=int, default=0 )
+
+    elixir_parser = subparsers.add_parser( 'elixir' )
+    elixir_parser.add_argument( '--guilds', type=int, default=10 )
+    elixir_parser.add_argument( '--members', type=int, default=5 )
+    elixir_parser.add_argument( '--iterations', type=int, default=10, help='alerts to play per channel' )
+    elixir_parser.add_argument( '--interval', type=float, default=1.5, help='seconds from joining to the first alert and between alerts' )
+
+    event_alerts_parser = subparsers.add_parser( 'event-alerts' )
+    event_alerts_parser.add_argument( '--iterations', type=int, default=20000 )
+
+    events_client_parser = subparsers.add_parser( 'events-client' )
+    events_client_parser.add_argument( '--iterations', type=int, default=200 )
+
+    for cog_parser in ( intros_parser, elixir_parser ):
+        cog_parser.add_argument( '--frame-interval', type=float, default=OPUS_FRAME_DURATION, help='seconds per fake Opus frame, 0 to play instantly' )
+
+    for subparser in ( decode_parser, intros_parser, elixir_parser, event_alerts_parser, events_client_parser ):
+        subparser.add_argument( '--allocations', action='store_true', help='trace allocations with tracemalloc' )
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'decode':
+        _run_with_allocations( lambda: benchmark_decode( args.iterations, args.repeats ), args.allocations )
+    elif args.benchmark == 'intros':
+        _run_with_allocations( lambda: _run_async( _benchmark_intros( args.guilds, args.members, args.rate, args.duration, args.frame_interval, args.debounce, args.prewarm, args.seed ) ), args.allocations )
+    elif args.benchmark == 'elixir':
+        _run_with_allocations( lambda: _run_async( _benchmark_elixir( args.guilds, args.members, args.iterations, args.interval, args.frame_interval ) ), args.allocations )
+    elif args.benchmark == 'event-alerts':
+        _run_with_allocations( lambda: benchmark_event_alerts( args.iterations ), args.allocations )
+    elif args.benchmark == 'events-client':
+        _run_with_allocations( lambda: _run_async( _benchmark_events_client( args.iterations ) ), args.allocations )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import asyncio
+import enum
+import logging
+import sqlite3
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import discord
+
+from discord.ext import commands
+
+from constants import DIABLO_VOICE_CHANNEL_IDS
+
+LOG = logging.getLogger( __name__ )
+
+class ChannelFeature( enum.Flag ):
+    NONE = 0
+    ELIXIR_ALERTS = enum.auto()
+    EVENT_ALERTS = enum.auto()
+
+DEFAULT_CHANNEL_FEATURES = ChannelFeature.ELIXIR_ALERTS | ChannelFeature.EVENT_ALERTS
+
+CHANNEL_FEATURE_NAMES: dict[ str, ChannelFeature ] = {
+    'elixir': ChannelFeature.ELIXIR_ALERTS,
+    'events': ChannelFeature.EVENT_ALERTS,
+}
+
+@dataclass( frozen=True, slots=True )
+class RegisteredChannel:
+    guild_id: int
+    channel_id: int
+    features: ChannelFeature
+
+class ChannelRegistry:
+    def __init__( self, db_path: Path ) -> None:
+        self.db_path = db_path
+
+        self.channels: dict[ int, RegisteredChannel ] = {}
+        self.guild_channel_ids: dict[ int, set[ int ] ] = {}
+        self.feature_channel_ids: dict[ ChannelFeature, set[ int ] ] = { f: set() for f in CHANNEL_FEATURE_NAMES.values() }
+
+        self.write_lock = asyncio.Lock()
+
+    def _connect( self ) -> sqlite3.Connection:
+        self.db_path.parent.mkdir( parents=True, exist_ok=True )
+        connection = sqlite3.connect( self.db_path )
+        connection.execute( 'CREATE TABLE IF NOT EXISTS channels ( channel_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, features INTEGER NOT NULL )' )
+        return connection
+
+    def load( self ):
+        with self._connect() as connection:
+            rows = connection.execute( 'SELECT guild_id, channel_id, features FROM channels' ).fetchall()
+
+        for guild_id, channel_id, features in rows:
+            self._index( RegisteredChannel( guild_id=guild_id, channel_id=channel_id, features=ChannelFeature( features ) ) )
+
+        LOG.info( f'Loaded channel registry: {sum( len( c ) for c in self.guild_channel_ids.values() )} channels in {len( self.guild_channel_ids )} guilds' )
+
+    def _index( self, channel: RegisteredChannel ):
+        self._unindex( channel.channel_id )
+
+        self.channels[ channel.channel_id ] = channel
+        if not channel.features:
+            return
+
+        self.guild_channel_ids.setdefault( channel.guild_id, set() ).add( channel.channel_id )
+        for feature, channel_ids in self.feature_channel_ids.items():
+            if feature in channel.features:
+                channel_ids.add( channel.channel_id )
+
+    def _unindex( self, channel_id: int ) -> RegisteredChannel | None:
+        channel = self.channels.pop( channel_id, None )
+        if channel is None:
+            return None
+
+        guild_channel_ids = self.guild_channel_ids.get( channel.guild_id, set() )
+        guild_channel_ids.discard( channel_id )
+        if not guild_channel_ids:
+            self.guild_channel_ids.pop( channel.guild_id, None )
+
+        for channel_ids in self.feature_channel_ids.values():
+            channel_ids.discard( channel_id )
+
+        return channel
+
+    def _write( self, sql: str, params: list[ tuple[ int, ... ] ] ):
+        with self._connect() as connection:
+            connection.executemany( sql, params )
+
+    def get_features( self, channel_id: int ) -> ChannelFeature:
+        channel = self.channels.get( channel_id )
+        return channel.features if channel else ChannelFeature.NONE
+
+    def has_feature( self, channel_id: int, feature: ChannelFeature ) -> bool:
+        return channel_id in self.feature_channel_ids[ feature ]
+
+    def channel_ids( self, feature: ChannelFeature ) -> set[ int ]:
+        return self.feature_channel_ids[ feature ]
+
+    def get_guild_channel_ids( self, guild_id: int ) -> set[ int ]:
+        return self.guild_channel_ids.get( guild_id, set() )
+
+    def guild_ids( self ) -> set[ int ]:
+        return set( self.guild_channel_ids.keys() )
+
+    async def register( self, guild_id: int, channel_id: int, features: ChannelFeature = DEFAULT_CHANNEL_FEATURES ):
+        await self.register_many( [ RegisteredChannel( guild_id=guild_id, channel_id=channel_id, features=features ) ] )
+
+    async def register_many( self, channels: list[ RegisteredChannel ] ):
+        if not channels:
+            return
+
+        # Index before the first await so listeners dispatched alongside the caller already see the channels
+        for channel in channels:
+            self._index( channel )
+
+        async with self.write_lock:
+            await asyncio.to_thread( self._write, 'INSERT OR REPLACE INTO channels ( channel_id, guild_id, features ) VALUES ( ?, ?, ? )', [ ( c.channel_id, c.guild_id, c.features.value ) for c in channels ] )
+
+    async def unregister( self, channel_id: int ) -> bool:
+        channel = self.channels.get( channel_id )
+        if channel is None or not channel.features:
+            return False
+
+        # Keep a featureless row so legacy channels are not registered again on the next start
+        await self.register( channel.guild_id, channel_id, ChannelFeature.NONE )
+
+        return True
+
+def parse_channel_features( names: tuple[ str, ... ] ) -> ChannelFeature:
+    if not names:
+        return DEFAULT_CHANNEL_FEATURES
+
+    features = ChannelFeature.NONE
+    for name in names:
+        feature = CHANNEL_FEATURE_NAMES.get( name.lower() )
+        if feature is None:
+            raise commands.BadArgument( f'Unknown channel feature: {name} (expected one of: {", ".join( CHANNEL_FEATURE_NAMES )})' )
+        features |= feature
+    return features
+
+def format_channel_features( features: ChannelFeature ) -> str:
+    return ', '.join( name for name, feature in CHANNEL_FEATURE_NAMES.items() if feature in features ) or 'none'
+
+class ChannelRegistryCog( commands.Cog ):
+    def __init__( self, bot: commands.Bot, registry: ChannelRegistry ) -> None:
+        self.bot = bot
+        self.registry = registry
+
+    def _legacy_channels( self, guild: discord.Guild ) -> list[ RegisteredChannel ]:
+        channels: list[ RegisteredChannel ] = []
+        for channel_id in DIABLO_VOICE_CHANNEL_IDS:
+            if channel_id in self.registry.channels:
+                continue
+
+            channel = guild.get_channel( channel_id )
+            if isinstance( channel, discord.VoiceChannel ):
+                LOG.info( f'Registering legacy Diablo voice channel for guild ({guild.name} - {guild.id}): {channel.name} - {channel.id}' )
+                channels.append( RegisteredChannel( guild_id=guild.id, channel_id=channel.id, features=DEFAULT_CHANNEL_FEATURES ) )
+        return channels
+
+    @commands.Cog.listener()
+    async def on_ready( self ):
+        await self.registry.register_many( [ c for guild in self.bot.guilds for c in self._legacy_channels( guild ) ] )
+
+    @commands.Cog.listener()
+    async def on_guild_join( self, guild: discord.Guild ):
+        await self.registry.register_many( self._legacy_channels( guild ) )
+
+    @commands.group( name='diablo', invoke_without_command=True )
+    @commands.guild_only()
+    @commands.has_guild_permissions( manage_guild=True )
+    async def diablo( self, ctx: commands.Context[ commands.Bot ] ):
+        assert ctx.guild is not None
+
+        channel_ids = self.registry.get_guild_channel_ids( ctx.guild.id )
+        if not channel_ids:
+            await ctx.send( 'No Diablo voice channels are registered.' )
+            return
+
+        lines = ( f'<#{cid}>: {format_channel_features( self.registry.get_features( cid ) )}' for cid in sorted( channel_ids ) )
+        await ctx.send( '\n'.join( lines ) )
+
+    @diablo.command( name='register' )
+    async def diablo_register( self, ctx: commands.Context[ commands.Bot ], channel: discord.VoiceChannel, *feature_names: str ):
+        features = parse_channel_features( feature_names )
+        await self.registry.register( channel.guild.id, channel.id, features )
+
+        LOG.info( f'Registered Diablo voice channel ({channel.name} - {channel.id}) for guild ({channel.guild.name} - {channel.guild.id}): {features}' )
+        await ctx.send( f'Registered {channel.mention}: {format_channel_features( features )}' )
+
+    @diablo.command( name='unregister' )
+    async def diablo_unregister( self, ctx: commands.Context[ commands.Bot ], channel: discord.VoiceChannel ):
+        if await self.registry.unregister( channel.id ):
+            LOG.info( f'Unregistered Diablo voice channel ({channel.name} - {channel.id}) for guild ({channel.guild.name} - {channel.guild.id})' )
+            await ctx.send( f'Unregistered {channel.mention}' )
+        else:
+            await ctx.send( f'{channel.mention} is not registered' )
@@ -4,7 +4,15 @@ ROOT_DIR = Path( __file__ ).parent
 
 LOGS_DIR = ROOT_DIR / 'logs'
 
+CACHE_DIR = ROOT_DIR / 'cache'
+TTS_CACHE_DIR = CACHE_DIR / 'tts'
+
+DATA_DIR = ROOT_DIR / 'data'
+CHANNEL_REGISTRY_DB_PATH = DATA_DIR / 'channels.sqlite3'
+SHARD_SOCKET_PATH = DATA_DIR / 'shards.sock'
+
 SOUNDS_DIR = ROOT_DIR / 'sounds'
+SOUNDS_MANIFEST_PATH = SOUNDS_DIR / 'manifest.json'
 
 INTRO_SOUNDS_DIR = SOUNDS_DIR / 'intros'
 WELCOME_SOUNDS_DIR = SOUNDS_DIR / 'welcomes'
@@ -1,57 +1,88 @@
-import asyncio
 import logging
 import random
 
-from datetime import datetime, timedelta
-from typing import Dict
+from collections import deque
+from datetime import datetime, timedelta, timezone
 
 import discord
 
-from discord.ext import tasks, commands
+from discord.ext import commands
 
-from constants import DIABLO_VOICE_CHANNEL_IDS, ELIXIR_ALERT_SOUNDS_DIR
-from utils import join_voice_chat, play_voice_channel_audio
+from channel_registry import ChannelFeature, ChannelRegistry
+from constants import ELIXIR_ALERT_SOUNDS_DIR
+from metrics import ALERT_LATENESS
+from scheduler import DeadlineScheduler
+from sound_cache import SoundCache
+from playback import PlaybackManager, PlaybackPriority
+from voice_connections import VoiceConnectionManager
 
 LOG = logging.getLogger( __name__ )
 
 AFTER_JOIN_ALERT_DELAY = timedelta( minutes=1 )
 ALERT_INTERVAL = timedelta( minutes=10 )
+ALERT_MAX_WAIT = 60
+ALERT_LATENESS_HISTORY = 100
+
+def has_human_members( channel: discord.VoiceChannel | discord.StageChannel ) -> bool:
+    return any( not m.bot for m in channel.members )
 
 class DiabloElixirAlerter( commands.Cog ):
-    def __init__( self, bot: commands.Bot ) -> None:
+    def __init__(
+        self,
+        bot: commands.Bot,
+        registry: ChannelRegistry,
+        sound_cache: SoundCache,
+        voice_connections: VoiceConnectionManager,
+        playback: PlaybackManager,
+        after_join_delay: timedelta = AFTER_JOIN_ALERT_DELAY,
+        alert_interval: timedelta = ALERT_INTERVAL,
+    ) -> None:
         self.bot = bot
-        self.next_alert_time: Dict[ int, datetime ] = {}
+        self.registry = registry
+        self.sound_cache = sound_cache
+        self.voice_connections = voice_connections
+        self.playback = playback
+        self.after_join_delay = after_join_delay
+        self.alert_interval = alert_interval
+
+        self.alert_scheduler = DeadlineScheduler( 'elixir-alerts' )
+        self.alert_lateness: deque[ timedelta ] = deque( maxlen=ALERT_LATENESS_HISTORY )
+
+        self.alert_sound_mp3_paths = sorted( ELIXIR_ALERT_SOUNDS_DIR.glob( '*.mp3' ) )
+
+    def _arm_guild_elixir_alerts( self, guild: discord.Guild ):
+        for channel_id in self.registry.get_guild_channel_ids( guild.id ):
+            if not self.registry.has_feature( channel_id, ChannelFeature.ELIXIR_ALERTS ) or self.alert_scheduler.is_scheduled( channel_id ):
+                continue
 
-        self.elixir_alert.start()
+            channel = guild.get_channel( channel_id )
+            if isinstance( channel, discord.VoiceChannel ) and has_human_members( channel ):
+                LOG.info( f'Detected occupied Diablo voice channel ({channel.name} - {channel.id}) in guild ({guild.name} - {guild.id}), arming elixir alert' )
+                self._arm_elixir_alert( channel_id, datetime.now( tz=timezone.utc ) + self.after_join_delay )
 
-    def _set_guild_next_alert_time( self, guild: discord.Guild ):
-        for channel_id in DIABLO_VOICE_CHANNEL_IDS:
-            if channel_id not in self.next_alert_time:
-                channel = guild.get_channel( channel_id )
-                if isinstance( channel, discord.VoiceChannel ):
-                    LOG.info( f'Detected guild ({guild.name} - {guild.id}) with Diablo voice channel ({channel.name} - {channel.id}), adding next alert time' )
-                    self.next_alert_time[ channel_id ] = datetime.min
-                    return
+    def _arm_elixir_alert( self, channel_id: int, alert_time: datetime ):
+        async def perform_alert():
+            self._arm_elixir_alert( channel_id, alert_time + self.alert_interval )
+            await self._perform_elixir_alert_safe( channel_id, alert_time )
 
-        LOG.info( f'Guild ({guild.name} - {guild.id}) has not Diablo voice channel' )
+        LOG.debug( f'Arming elixir alert: {channel_id} - {alert_time}' )
+        self.alert_scheduler.schedule( channel_id, alert_time, perform_alert )
+
+    def _disarm_elixir_alert( self, channel_id: int ):
+        if self.alert_scheduler.cancel( channel_id ):
+            LOG.info( f'Empty channel detected: {channel_id}' )
 
     async def cog_unload( self ):
-        self.elixir_alert.cancel()
+        self.alert_scheduler.stop()
 
     @commands.Cog.listener()
     async def on_guild_join( self, guild: discord.Guild ):
-        self._set_guild_next_alert_time( guild )
-
-    @tasks.loop( minutes=1 )
-    async def elixir_alert( self ):
-        await asyncio.gather( *( self._perform_elixir_alert_safe( cid ) for cid in self.next_alert_time.keys() ), return_exceptions=True )
-
-    @elixir_alert.before_loop
-    async def before_elixir_alert( self ):
-        await self.bot.wait_until_ready()
+        self._arm_guild_elixir_alerts( guild )
 
+    @commands.Cog.listener()
+    async def on_ready( self ):
         for guild in self.bot.guilds:
-            self._set_guild_next_alert_time( guild )
+            self._arm_guild_elixir_alerts( guild )
 
     @commands.Cog.listener()
     async def on_voice_state_update( self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState ):
@@ -60,57 +91,50 @@ class DiabloElixirAlerter( commands.Cog ):
         if before.channel == after.channel:
             return
 
-        if before.channel and before.channel.id in self.next_alert_time:
-            await self._perform_elixir_alert_safe( before.channel.id )
-        elif after.channel and after.channel.id in self.next_alert_time:
-            await self._perform_elixir_alert_safe( after.channel.id, new_member=True )
+        if before.channel and self.alert_scheduler.is_scheduled( before.channel.id ):
+            if not has_human_members( before.channel ):
+                self._disarm_elixir_alert( before.channel.id )
 
-    async def _perform_elixir_alert_safe( self, channel_id: int, new_member: bool = False ):
+        if after.channel and self.registry.has_feature( after.channel.id, ChannelFeature.ELIXIR_ALERTS ):
+            LOG.info( f'Member join detected: {after.channel.id}' )
+            self._arm_elixir_alert( after.channel.id, datetime.now( tz=timezone.utc ) + self.after_join_delay )
+
+    def _record_alert_lateness( self, alert_time: datetime ):
+        lateness = datetime.now( tz=timezone.utc ) - alert_time
+        self.alert_lateness.append( lateness )
+        ALERT_LATENESS.observe( lateness.total_seconds(), alert='elixir' )
+
+    async def _perform_elixir_alert_safe( self, channel_id: int, alert_time: datetime ):
         try:
-            await self._perform_elixir_alert( channel_id, new_member=new_member )
+            await self._perform_elixir_alert( channel_id, alert_time )
         except Exception as ex:
             LOG.error( f'Failed to perform elixir alert for channel: {channel_id}', exc_info=ex )
 
-    async def _perform_elixir_alert( self, channel_id: int, new_member: bool = False ):
+    async def _perform_elixir_alert( self, channel_id: int, alert_time: datetime ):
         LOG.debug( f'Performing elixir alert: {channel_id}' )
 
-        if channel_id not in self.next_alert_time:
-            LOG.warning( f'Unknown channel ID: {channel_id}' )
-            return
-
         channel = self.bot.get_channel( channel_id )
         if not isinstance( channel, ( discord.VoiceChannel, discord.StageChannel ) ):
             if channel:
                 LOG.warning( f'Channel is not a voice channel: {channel_id}' )
             else:
                 LOG.warning( f'Could not find voice channel: {channel_id}' )
+            self._disarm_elixir_alert( channel_id )
             return
 
-        if len( channel.members ) == 0 or all( m.bot for m in channel.members ):
-            if self.next_alert_time[ channel_id ] != datetime.min:
-                LOG.info( f'Empty channel detected: {channel_id}' )
-                self.next_alert_time[ channel_id ] = datetime.min
-            return
-
-        if new_member or self.next_alert_time[ channel_id ] == datetime.min:
-            LOG.info( f'First member join detected: {channel_id}' )
-            self.next_alert_time[ channel_id ] = datetime.now() + AFTER_JOIN_ALERT_DELAY
-            return
-
-        now = datetime.now()
-        if self.next_alert_time[ channel_id ] > now:
-            LOG.debug( f'Waiting for alert time: {channel_id} - {( self.next_alert_time[ channel_id ] - now )} remaining' )
+        if not self.registry.has_feature( channel_id, ChannelFeature.ELIXIR_ALERTS ) or not has_human_members( channel ):
+            self._disarm_elixir_alert( channel_id )
             return
 
         LOG.info( f'Playing elixir alert: {channel_id}' )
-        self.next_alert_time[ channel_id ] = now + ALERT_INTERVAL
 
-        voice_client = await join_voice_chat( self.bot, channel )
+        voice_client = await self.voice_connections.connect( channel )
 
-        alert_sound_mp3_path = random.choice( list( ELIXIR_ALERT_SOUNDS_DIR.glob( '*.mp3' ) ) )
+        alert_sound_mp3_path = random.choice( self.alert_sound_mp3_paths )
 
         try:
-            source = discord.PCMVolumeTransformer( discord.FFmpegPCMAudio( source=str( alert_sound_mp3_path ) ) )
-            await play_voice_channel_audio( voice_client, source )
+            source = await self.sound_cache.get_audio( alert_sound_mp3_path )
+            source.on_first_frame = lambda: self._record_alert_lateness( alert_time )
+            await self.playback.play( voice_client, source, PlaybackPriority.ELIXIR_ALERT, max_wait=ALERT_MAX_WAIT )
         except Exception as ex:
-            LOG.error( f'Failed to play elixir alert: {channel_id} - {alert_sound_mp3_path}', exc_info=ex )
\ No newline at end of file
+            LOG.error( f'Failed to play elixir alert: {channel_id} - {alert_sound_mp3_path}', exc_info=ex )
@@ -1,11 +1,20 @@
-from dataclasses import dataclass
-from typing import Dict
+import json
+import logging
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict
 
 import aiohttp
 
-from jsonschema import validate
+from jsonschema import Draft202012Validator
 
-@dataclass
+from metrics import EVENTS_POLL_LATENCY
+
+LOG = logging.getLogger( __name__ )
+
+@dataclass( frozen=True, slots=True )
 class DiabloBossEvent:
     name: str
     expectedName: str
@@ -16,7 +25,7 @@ class DiabloBossEvent:
     territory: str
     zone: str
 
-@dataclass
+@dataclass( frozen=True, slots=True )
 class DiabloLegionEvent:
     timestamp: int
     expected: int
@@ -24,18 +33,25 @@ class DiabloLegionEvent:
     territory: str
     zone: str
 
-@dataclass
+@dataclass( frozen=True, slots=True )
 class DiabloHelltideEvent:
     timestamp: int
     zone: str
     refresh: int
 
-@dataclass
+@dataclass( frozen=True, slots=True )
 class DiabloEvents:
     boss: DiabloBossEvent
     legion: DiabloLegionEvent
     helltide: DiabloHelltideEvent
 
+DIABLO_EVENTS_URL = 'https://d4armory.io/api/events/recent'
+
+EVENTS_CLIENT_TIMEOUT = aiohttp.ClientTimeout( total=20, connect=5, sock_connect=5, sock_read=10 )
+EVENTS_CLIENT_KEEPALIVE_TIMEOUT = 5 * 60
+EVENTS_CLIENT_DNS_CACHE_TTL = 60 * 60
+EVENTS_CLIENT_STATS_HISTORY = 100
+
 HELLTIDE_ZONE_NAMES: Dict[ str, str ] = {
   'kehj': 'Kehjistan',
   'hawe': 'Hawezar',
@@ -75,7 +91,7 @@ EVENTS_SCHEMA = {
         'helltide': {
             'type': 'object',
             'properties': {
-                'timstamp': { 'type': 'integer' },
+                'timestamp': { 'type': 'integer' },
                 'zone': { 'type': 'string' },
                 'refresh': { 'type': 'integer' },
             },
@@ -85,27 +101,161 @@ EVENTS_SCHEMA = {
     'required': [ 'boss', 'legion', 'helltide' ]
 }
 
-async def get_diablo_events() -> DiabloEvents:
-    async with aiohttp.ClientSession() as session:
-        async with session.get( 'https://d4armory.io/api/events/recent' ) as response:
-            response.raise_for_status()
+EVENTS_VALIDATOR = Draft202012Validator( EVENTS_SCHEMA )
+
+class DiabloEventsDecodeError( ValueError ):
+    def __init__( self, errors: list[ str ] ) -> None:
+        super().__init__( f'Invalid Diablo events payload: {"; ".join( errors )}' )
+        self.errors = errors
+
+def decode_diablo_events( body: bytes | str ) -> DiabloEvents:
+    try:
+        data = json.loads( body )
+    except ValueError as ex:
+        raise DiabloEventsDecodeError( [ f'$: {ex}' ] ) from ex
 
-            data = await response.json()
+    errors = [ f'${"".join( f"[{p!r}]" for p in e.absolute_path )}: {e.message}' for e in EVENTS_VALIDATOR.iter_errors( data ) ]
+    if errors:
+        raise DiabloEventsDecodeError( errors )
 
-    validate( data, EVENTS_SCHEMA )
+    boss = data[ 'boss' ]
+    legion = data[ 'legion' ]
+    helltide = data[ 'helltide' ]
 
     return DiabloEvents(
         boss=DiabloBossEvent(
-            **data[ 'boss' ],
+            name=boss[ 'name' ],
+            expectedName=boss[ 'expectedName' ],
+            nextExpectedName=boss[ 'nextExpectedName' ],
+            timestamp=boss[ 'timestamp' ],
+            expected=boss[ 'expected' ],
+            nextExpected=boss[ 'nextExpected' ],
+            territory=boss[ 'territory' ],
+            zone=boss[ 'zone' ],
         ),
         legion=DiabloLegionEvent(
-            **data[ 'legion' ],
+            timestamp=legion[ 'timestamp' ],
+            expected=legion[ 'expected' ],
+            nextExpected=legion[ 'nextExpected' ],
+            territory=legion[ 'territory' ],
+            zone=legion[ 'zone' ],
         ),
         helltide=DiabloHelltideEvent(
-            **data[ 'helltide' ],
-        )
+            timestamp=helltide[ 'timestamp' ],
+            zone=helltide[ 'zone' ],
+            refresh=helltide[ 'refresh' ],
+        ),
     )
 
+@dataclass
+class EventsClientStats:
+    requests: int = 0
+    not_modified: int = 0
+    failures: int = 0
+    bytes_received: int = 0
+    response_times: deque[ float ] = field( default_factory=lambda: deque( maxlen=EVENTS_CLIENT_STATS_HISTORY ) )
+
+    @property
+    def average_response_time( self ) -> float | None:
+        if not self.response_times:
+            return None
+        return sum( self.response_times ) / len( self.response_times )
+
+class EventsClient:
+    def __init__( self, url: str = DIABLO_EVENTS_URL, timeout: aiohttp.ClientTimeout = EVENTS_CLIENT_TIMEOUT, on_body: Callable[ [ bytes ], None ] | None = None, on_poll: Callable[ [ str ], None ] | None = None ) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.on_body = on_body
+        self.on_poll = on_poll
+
+        self.session: aiohttp.ClientSession | None = None
+
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.body: bytes | None = None
+        self.events: DiabloEvents | None = None
+        self.last_result = 'error'
+
+        self.stats = EventsClientStats()
+
+    def _get_session( self ) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector( limit=1, keepalive_timeout=EVENTS_CLIENT_KEEPALIVE_TIMEOUT, ttl_dns_cache=EVENTS_CLIENT_DNS_CACHE_TTL )
+            self.session = aiohttp.ClientSession( connector=connector, timeout=self.timeout, raise_for_status=False )
+        return self.session
+
+    async def close( self ):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_events( self ) -> DiabloEvents:
+        self.last_result = 'error'
+        try:
+            return await self._get_events()
+        finally:
+            if self.on_poll is not None:
+                self.on_poll( self.last_result )
+
+    async def _get_events( self ) -> DiabloEvents:
+        headers: dict[ str, str ] = {}
+        if self.events is not None:
+            if self.etag:
+                headers[ 'If-None-Match' ] = self.etag
+            if self.last_modified:
+                headers[ 'If-Modified-Since' ] = self.last_modified
+
+        self.stats.requests += 1
+        start = time.perf_counter()
+        result = 'error'
+
+        try:
+            async with self._get_session().get( self.url, headers=headers ) as response:
+                if response.status == 304 and self.events is not None:
+                    self.stats.not_modified += 1
+                    result = 'not_modified'
+                    return self.events
+
+                response.raise_for_status()
+
+                body = await response.read()
+
+                etag = response.headers.get( 'ETag' )
+                last_modified = response.headers.get( 'Last-Modified' )
+                result = 'ok'
+        except Exception:
+            self.stats.failures += 1
+            raise
+        finally:
+            response_time = time.perf_counter() - start
+            self.stats.response_times.append( response_time )
+            EVENTS_POLL_LATENCY.observe( response_time, result=result )
+            self.last_result = result
+
+        self.stats.bytes_received += len( body )
+
+        self.etag = etag
+        self.last_modified = last_modified
+
+        if self.events is not None and body == self.body:
+            self.last_result = 'unchanged'
+            return self.events
+
+        self.events = decode_diablo_events( body )
+        self.body = body
+
+        if self.on_body is not None:
+            self.on_body( body )
+
+        return self.events
+
+async def get_diablo_events() -> DiabloEvents:
+    client = EventsClient()
+    try:
+        return await client.get_events()
+    finally:
+        await client.close()
+
 if __name__ == '__main__':
     import asyncio
 
@@ -1,19 +1,28 @@
 import asyncio
-import io
 import logging
+import xml.sax.saxutils
 
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Sequence
+from collections import deque
+from typing import Awaitable, Sequence
 
 import discord
 
 from discord.ext import tasks, commands
 
-from constants import DIABLO_VOICE_CHANNEL_IDS
-from diablo_events import HELLTIDE_ZONE_NAMES, DiabloBossEvent, DiabloEvents, DiabloHelltideEvent, DiabloLegionEvent, get_diablo_events
+from channel_registry import ChannelFeature, ChannelRegistry
+from diablo_events import HELLTIDE_ZONE_NAMES, DiabloBossEvent, DiabloEvents, DiabloHelltideEvent, DiabloLegionEvent, EventsClient
+from diablo_events_predictor import HELLTIDE_INTERVAL, predict_diablo_events, predict_transition_times
+from metrics import ALERT_LATENESS
+from phrase_segments import PhraseSegmentLibrary
+from poll_interval import AdaptivePollInterval
+from scheduler import DeadlineScheduler
+from playback import PlaybackManager, PlaybackPriority
+from sound_cache import CachedOpusAudio, SoundCache
 from tts import TTS
-from utils import join_voice_chat, play_voice_channel_audio
+from utils import sleep_until
+from voice_connections import VoiceConnectionManager
 
 LOG = logging.getLogger( __name__ )
 
@@ -33,15 +42,35 @@ HELLTIDE_ALERT_INTERVALS = [
     timedelta( minutes=1 ),
 ]
 
+ALERT_STAGING_LEAD = timedelta( seconds=45 )
+ALERT_PRE_CONNECT_LEAD = timedelta( seconds=5 )
+ALERT_LATENESS_TOLERANCE = timedelta( seconds=1 )
+ALERT_MAX_WAIT = 30
+ALERT_TTS_DEADLINE = 5.0
+ALERT_BATCH_WINDOW = timedelta( seconds=15 )
+ALERT_BATCH_PAUSE = timedelta( milliseconds=750 )
+ALERT_LATENESS_HISTORY = 100
+
+PREDICTION_ROLL_DELAY = timedelta( seconds=1 )
+
+WORLD_BOSS_NAMES = ( 'Ashava', 'Avarice', 'Wandering Death' )
+MAX_ALERT_HOURS = 4
+
 DiabloEvent = DiabloBossEvent | DiabloLegionEvent | DiabloHelltideEvent
 
+StagedAlertKey = tuple[ str, datetime, datetime ]
+
 @dataclass
 class DiabloEventAlert:
     event: DiabloEvent
-    text: str
+    parts: tuple[ str, ... ]
     event_time: datetime
     alert_time: datetime
 
+    @property
+    def text( self ) -> str:
+        return ' '.join( self.parts )
+
 def get_event_time( now: datetime, timestamp: int, expected: int ) -> datetime:
     timestamp_date = datetime.fromtimestamp( timestamp, timezone.utc )
     if timestamp_date < now:
@@ -49,26 +78,43 @@ def get_event_time( now: datetime, timestamp: int, expected: int ) -> datetime:
     else:
         return timestamp_date
 
-def diablo_events_to_alerts( now: datetime, last_alert_time: datetime, events: DiabloEvents ) -> list[ DiabloEventAlert ]:
-    alerts: list[ DiabloEventAlert ] = []
+def event_location_parts( territory: str, zone: str ) -> tuple[ str, ... ]:
+    location = f'{territory} {zone}'.strip()
+    if not location:
+        return ()
+    return ( f'in {location}', )
 
-    boss_time = get_event_time( now, events.boss.timestamp, events.boss.expected )
-    boss_text = f'{events.boss.expectedName} spawning in {events.boss.territory} {events.boss.zone} in'
+def boss_alert_parts( name: str, territory: str, zone: str ) -> tuple[ str, ... ]:
+    return ( f'{name} spawning', *event_location_parts( territory, zone ), 'in' )
+
+def legion_alert_parts( territory: str, zone: str ) -> tuple[ str, ... ]:
+    return ( 'Legions are gathering', *event_location_parts( territory, zone ), 'in' )
+
+def helltide_alert_parts( zone: str ) -> tuple[ str, ... ]:
+    return ( f'The Helltide will rise in {HELLTIDE_ZONE_NAMES.get( zone, "Sanctuary" )}', 'in' )
 
+def diablo_event_times( now: datetime, events: DiabloEvents ) -> tuple[ datetime, datetime, datetime ]:
+    boss_time = get_event_time( now, events.boss.timestamp, events.boss.expected )
     legion_time = get_event_time( now, events.legion.timestamp, events.legion.expected )
-    legion_text = f'Legions are gathering in {events.legion.territory} {events.legion.zone} in'
+    helltide_time = get_event_time( now, events.helltide.timestamp, events.helltide.timestamp + int( HELLTIDE_INTERVAL.total_seconds() ) )
+    return boss_time, legion_time, helltide_time
+
+def diablo_events_to_alerts( now: datetime, last_alert_time: datetime, events: DiabloEvents, all_intervals: bool = False ) -> list[ DiabloEventAlert ]:
+    alerts: list[ DiabloEventAlert ] = []
 
-    helltide_time = get_event_time( now, events.helltide.timestamp, events.helltide.timestamp + ( 2 * 60 + 15 ) * 60 )
-    helltide_zone = HELLTIDE_ZONE_NAMES.get( events.helltide.zone, 'Sanctuary' )
-    helltide_text = f'The Helltide will rise in {helltide_zone} in'
+    boss_time, legion_time, helltide_time = diablo_event_times( now, events )
 
-    alert_configs: Sequence[ tuple[ DiabloEvent, datetime, str, list[ timedelta ] ] ] = (
-        ( events.boss, boss_time, boss_text, BOSS_ALERT_INTERVALS ),
-        ( events.legion, legion_time, legion_text, LEGION_ALERT_INTERVALS ),
-        ( events.helltide, helltide_time, helltide_text, HELLTIDE_ALERT_INTERVALS ),
+    boss_parts = boss_alert_parts( events.boss.expectedName, events.boss.territory, events.boss.zone )
+    legion_parts = legion_alert_parts( events.legion.territory, events.legion.zone )
+    helltide_parts = helltide_alert_parts( events.helltide.zone )
+
+    alert_configs: Sequence[ tuple[ DiabloEvent, datetime, tuple[ str, ... ], list[ timedelta ] ] ] = (
+        ( events.boss, boss_time, boss_parts, BOSS_ALERT_INTERVALS ),
+        ( events.legion, legion_time, legion_parts, LEGION_ALERT_INTERVALS ),
+        ( events.helltide, helltide_time, helltide_parts, HELLTIDE_ALERT_INTERVALS ),
     )
 
-    for event, event_time, event_text, alert_intervals in alert_configs:
+    for event, event_time, event_parts, alert_intervals in alert_configs:
         for interval in sorted( alert_intervals, reverse=True ):
             alert_time = event_time - interval
             if alert_time < last_alert_time:
@@ -76,23 +122,24 @@ def diablo_events_to_alerts( now: datetime, last_alert_time: datetime, events: D
 
             alerts.append( DiabloEventAlert(
                 event=event,
-                text=event_text,
+                parts=event_parts,
                 event_time=event_time,
                 alert_time=event_time - interval,
             ) )
-            break
+            if not all_intervals:
+                break
 
     sorted_alerts = sorted( alerts, key=lambda a: a.alert_time )
 
     return sorted_alerts
 
-def format_event_time_till( time_till_event: timedelta ) -> str:
+def event_time_till_parts( time_till_event: timedelta ) -> list[ str ]:
     time: list[ str ] = []
 
     total_seconds = time_till_event.total_seconds() - 5
 
     if total_seconds <= 60:
-        return 'less than 1 minute'
+        return [ 'less than 1 minute' ]
 
     hours = int( total_seconds / 60 / 60 )
     total_seconds -= hours * 60 * 60
@@ -109,116 +156,306 @@ def format_event_time_till( time_till_event: timedelta ) -> str:
         if seconds != 0:
             time.append( f'{seconds} seconds' )
 
-    return ' '.join( time )
+    return time
+
+def format_event_time_till( time_till_event: timedelta ) -> str:
+    return ' '.join( event_time_till_parts( time_till_event ) )
+
+def event_alert_vocabulary() -> list[ str ]:
+    parts = [ 'in', 'less than 1 minute', 'Legions are gathering' ]
+    parts.extend( f'{name} spawning' for name in WORLD_BOSS_NAMES )
+    parts.extend( helltide_alert_parts( zone )[ 0 ] for zone in ( *HELLTIDE_ZONE_NAMES, '' ) )
+    parts.extend( f'{hours} hours' for hours in range( 1, MAX_ALERT_HOURS + 1 ) )
+    parts.extend( f'{minutes} minutes' for minutes in range( 1, 60 ) )
+    parts.extend( f'{seconds} seconds' for seconds in range( 1, 60 ) )
+    return parts
+
+def diablo_events_vocabulary( events: DiabloEvents ) -> list[ str ]:
+    return [
+        *boss_alert_parts( events.boss.expectedName, events.boss.territory, events.boss.zone ),
+        *boss_alert_parts( events.boss.nextExpectedName, events.boss.territory, events.boss.zone )[ :1 ],
+        *legion_alert_parts( events.legion.territory, events.legion.zone ),
+        *helltide_alert_parts( events.helltide.zone ),
+    ]
+
+def batch_event_alerts( alerts: list[ DiabloEventAlert ], window: timedelta ) -> list[ list[ DiabloEventAlert ] ]:
+    batches: list[ list[ DiabloEventAlert ] ] = []
+    for alert in sorted( alerts, key=lambda a: a.alert_time ):
+        if batches and alert.alert_time - batches[ -1 ][ 0 ].alert_time <= window:
+            batches[ -1 ].append( alert )
+        else:
+            batches.append( [ alert ] )
+    return batches
+
+def format_event_alerts_ssml( texts: list[ str ] ) -> str:
+    pause = f'<break time="{int( ALERT_BATCH_PAUSE.total_seconds() * 1000 )}ms"/>'
+    return f'<speak>{pause.join( xml.sax.saxutils.escape( t ) for t in texts )}</speak>'
 
 class DiabloEventsAlerter( commands.Cog ):
-    def __init__( self, bot: commands.Bot, tts: TTS ) -> None:
+    def __init__(
+        self,
+        bot: commands.Bot,
+        registry: ChannelRegistry,
+        tts: TTS,
+        sound_cache: SoundCache,
+        voice_connections: VoiceConnectionManager,
+        playback: PlaybackManager,
+        events_client: EventsClient | None = None,
+        segments: PhraseSegmentLibrary | None = None,
+        poll_events: bool = True,
+    ) -> None:
         self.bot = bot
+        self.registry = registry
         self.tts = tts
+        self.sound_cache = sound_cache
+        self.voice_connections = voice_connections
+        self.playback = playback
 
-        self.diablo_voice_channel_ids: set[ int ] = set()
+        self.segments = segments or PhraseSegmentLibrary( tts, sound_cache, timeout=ALERT_TTS_DEADLINE )
+        self.segment_prewarms: set[ asyncio.Task[ None ] ] = set()
+        self.vocabulary_prewarmed = False
 
+        self.events_client = events_client if events_client is not None or not poll_events else EventsClient()
+        self.poll_interval = AdaptivePollInterval()
         self.events: DiabloEvents | None = None
-        self.alerts: list[ DiabloEventAlert ] | None = None
-        self.last_alert_time: datetime = datetime.min.replace( tzinfo=timezone.utc )
+        self.pending_events: DiabloEvents | None = None
         self.first_alert = True
 
-        self.events_retrieved = asyncio.Event()
+        self.alert_scheduler = DeadlineScheduler( 'event-alerts' )
+        self.alert_lateness: deque[ timedelta ] = deque( maxlen=ALERT_LATENESS_HISTORY )
 
-        self.events_retriever.start()
-        self.events_alerter.start()
+        self.staged_alerts: dict[ StagedAlertKey, asyncio.Task[ None ] ] = {}
+        self.staged_alert_keys: set[ StagedAlertKey ] = set()
 
-    def _check_guild_for_diablo_voice_channel( self, guild: discord.Guild ):
-        for channel_id in DIABLO_VOICE_CHANNEL_IDS:
-            if channel_id not in self.diablo_voice_channel_ids:
-                channel = guild.get_channel( channel_id )
-                if isinstance( channel, discord.VoiceChannel ):
-                    LOG.info( f'Detected guild ({guild.name} - {guild.id}) with Diablo voice channel ({channel.name} - {channel.id}), adding to Diablo events alerter' )
-                    self.diablo_voice_channel_ids.add( channel_id )
-                    return
+        if poll_events:
+            self.events_retriever.start()
 
-        LOG.info( f'Guild ({guild.name} - {guild.id}) has not Diablo voice channel' )
+    def _get_event_alert_channels( self ) -> list[ discord.VoiceChannel ]:
+        channels = ( self.bot.get_channel( cid ) for cid in self.registry.channel_ids( ChannelFeature.EVENT_ALERTS ) )
+        channels = ( c for c in channels if isinstance( c, discord.VoiceChannel ) and len( c.members ) > 0 and not all( m.bot for m in c.members ) )
+        return list( channels )
 
-    async def _perform_event_alert_for_channel( self, channel: discord.VoiceChannel, audio_content: bytes ):
-        if all( m.bot for m in channel.members ):
-            LOG.info( f'Skipping event alert for empty channel: {channel.name} (ID: {channel.id})' )
-            return
+    async def _prewarm_segments( self, texts: list[ str ] ):
+        try:
+            await self.segments.prewarm( texts )
+        except Exception as ex:
+            LOG.warning( 'Failed to pre-render event alert phrase segments', exc_info=ex )
+
+    def _queue_segments_prewarm( self, events: DiabloEvents ):
+        texts = diablo_events_vocabulary( events )
+        if not self.vocabulary_prewarmed:
+            texts.extend( event_alert_vocabulary() )
+            self.vocabulary_prewarmed = True
+
+        task = asyncio.create_task( self._prewarm_segments( texts ) )
+        self.segment_prewarms.add( task )
+        task.add_done_callback( self.segment_prewarms.discard )
+
+    async def _render_event_alert( self, phrases: list[ list[ str ] ] ) -> tuple[ bytes, ... ]:
+        texts = [ ' '.join( parts ) for parts in phrases ]
+        LOG.info( f'Event alert text: {" / ".join( texts )}' )
+
+        try:
+            return await self.segments.assemble( phrases, ALERT_BATCH_PAUSE.total_seconds() )
+        except Exception as ex:
+            LOG.warning( 'Failed to assemble event alert from phrase segments, falling back to TTS', exc_info=ex )
+
+        if len( texts ) == 1:
+            text = texts[ 0 ]
+            ssml = False
+        else:
+            text = format_event_alerts_ssml( texts )
+            ssml = True
 
-        voice_client = await join_voice_chat( self.bot, channel )
+        audio_content = await self.tts.generate_tts( text, ssml=ssml, language_code='en-US', voice_name='en-US-Neural2-C', deadline=ALERT_TTS_DEADLINE )
+        return await self.sound_cache.decode( audio_content )
 
+    async def _perform_event_alert_for_channel( self, channel: discord.VoiceChannel, voice_client: discord.VoiceClient, frames: tuple[ bytes, ... ] ):
         try:
-            source = discord.FFmpegPCMAudio( source=io.BytesIO( audio_content ), pipe=True )
-            await play_voice_channel_audio( voice_client, source )
+            await self.playback.play( voice_client, CachedOpusAudio( frames ), PlaybackPriority.EVENT_ALERT, max_wait=ALERT_MAX_WAIT, preempt=True )
         except Exception as ex:
             LOG.error( f'Failed to play event alert audio for channel: {channel.name} (ID: {channel.id})', exc_info=ex )
 
-    async def _perform_event_alerts( self, event_prefix: str, time_till_event: timedelta ):
-        channels = ( self.bot.get_channel( cid ) for cid in self.diablo_voice_channel_ids )
-        channels = ( c for c in channels if isinstance( c, discord.VoiceChannel ) and len( c.members ) > 0 and not all( m.bot for m in c.members ) )
-        channels = list( channels )
+    async def _perform_event_alerts_for_guild( self, channels: list[ discord.VoiceChannel ], voice_client: discord.VoiceClient | BaseException, frames: tuple[ bytes, ... ] ):
+        for i, channel in enumerate( channels ):
+            if i > 0:
+                try:
+                    voice_client = await self.voice_connections.connect( channel )
+                except Exception as ex:
+                    voice_client = ex
+
+            if isinstance( voice_client, BaseException ):
+                LOG.error( f'Failed to join channel for event alert: {channel.name} (ID: {channel.id})', exc_info=voice_client )
+                continue
+
+            await self._perform_event_alert_for_channel( channel, voice_client, frames )
+
+    async def _stage_event_alerts( self, alerts: list[ DiabloEventAlert ], play_time: datetime ):
+        phrases = [ [ *a.parts, *event_time_till_parts( a.event_time - play_time ) ] for a in alerts ]
 
+        frames: tuple[ bytes, ... ] | None = None
+        if len( self._get_event_alert_channels() ) > 0:
+            frames = await self._render_event_alert( phrases )
+
+        await sleep_until( play_time - ALERT_PRE_CONNECT_LEAD )
+
+        channels = self._get_event_alert_channels()
         if len( channels ) == 0:
+            LOG.debug( f'Skipping event alerts with no listeners: {alerts}' )
             return
 
-        time_till_text = format_event_time_till( time_till_event )
-        time_till_event_text = f'{event_prefix} {time_till_text}'
+        guild_channels: dict[ int, list[ discord.VoiceChannel ] ] = {}
+        for channel in channels:
+            guild_channels.setdefault( channel.guild.id, [] ).append( channel )
 
-        LOG.info( f'Event alert text: {time_till_event_text}' )
-        audio_content = await self.tts.generate_tts( time_till_event_text, language_code='en-US', voice_name='en-US-Neural2-C' )
+        voice_clients = await asyncio.gather( *( self.voice_connections.connect( c[ 0 ] ) for c in guild_channels.values() ), return_exceptions=True )
 
-        await asyncio.gather( *( self._perform_event_alert_for_channel( c, audio_content ) for c in channels ), return_exceptions=True )
+        if frames is None:
+            frames = await self._render_event_alert( phrases )
 
-    async def cog_unload( self ):
-        self.events_retriever.cancel()
-        self.events_alerter.cancel()
+        await sleep_until( play_time )
 
-    @commands.Cog.listener()
-    async def on_guild_join( self, guild: discord.Guild ):
-        self._check_guild_for_diablo_voice_channel( guild )
+        lateness = datetime.now( tz=timezone.utc ) - play_time
+        self.alert_lateness.append( lateness )
+        ALERT_LATENESS.observe( lateness.total_seconds(), alert='event' )
+        if lateness > ALERT_LATENESS_TOLERANCE:
+            LOG.warning( f'Event alerts started late: lateness={lateness}, alerts={alerts}' )
+        else:
+            LOG.info( f'Performing event alerts: lateness={lateness}, alerts={alerts}' )
 
-    @commands.Cog.listener()
-    async def on_ready( self ):
-        for guild in self.bot.guilds:
-            self._check_guild_for_diablo_voice_channel( guild )
+        plays: list[ Awaitable[ None ] ] = []
+        for guild_channel_list, voice_client in zip( guild_channels.values(), voice_clients ):
+            plays.append( self._perform_event_alerts_for_guild( guild_channel_list, voice_client, frames ) )
+
+        await asyncio.gather( *plays, return_exceptions=True )
+
+    async def _stage_event_alerts_safe( self, keys: list[ StagedAlertKey ], alerts: list[ DiabloEventAlert ], play_time: datetime ):
+        try:
+            await self._stage_event_alerts( alerts, play_time )
+        except Exception as ex:
+            LOG.error( f'Failed to perform event alerts: {alerts}', exc_info=ex )
+        finally:
+            for key in keys:
+                if self.staged_alerts.get( key ) is asyncio.current_task():
+                    del self.staged_alerts[ key ]
+
+    def _schedule_event_alerts( self, alerts: list[ DiabloEventAlert ], play_time: datetime ):
+        keys: list[ StagedAlertKey ] = []
+        new_alerts: list[ DiabloEventAlert ] = []
+        for alert in alerts:
+            key = ( type( alert.event ).__name__, alert.event_time, play_time )
+            if key not in self.staged_alert_keys:
+                keys.append( key )
+                new_alerts.append( alert )
+
+        if not new_alerts:
+            return
+
+        LOG.debug( f'Staging event alerts: play_time={play_time}, alerts={new_alerts}' )
+        self.staged_alert_keys.update( keys )
+
+        task = asyncio.create_task( self._stage_event_alerts_safe( keys, new_alerts, play_time ) )
+        for key in keys:
+            self.staged_alerts[ key ] = task
 
-    @tasks.loop( seconds=10 )
-    async def events_alerter( self ):
-        if not self.events:
-            LOG.warning( 'No Diablo event set' )
+    def _reschedule_event_alerts( self ):
+        if self.events is None:
             return
 
         now = datetime.now( tz=timezone.utc )
 
-        LOG.debug( f'Checking for Diablo event alerts: {now}' )
+        events = predict_diablo_events( self.events, now )
+        if events != self.events:
+            LOG.info( f'Scheduling Diablo event alerts from predicted events: {events}' )
 
-        alerts = diablo_events_to_alerts( now, self.last_alert_time, self.events )
+        self.staged_alert_keys = { k for k in self.staged_alert_keys if k[ 2 ] >= now - ALERT_STAGING_LEAD }
+        self.alert_scheduler.clear()
 
-        for alert in alerts:
-            if self.first_alert or alert.alert_time <= now:
-                LOG.info( f'Performing event alert: now={now}, alert={alert}' )
-                await self._perform_event_alerts( alert.text, alert.event_time - now )
+        alerts = diablo_events_to_alerts( now, now, events, all_intervals=True )
+
+        event_keys = { ( type( a.event ).__name__, a.event_time ) for a in alerts }
+        superseded_tasks = { t for k, t in self.staged_alerts.items() if k[ 2 ] > now and k[ :2 ] not in event_keys }
+        for key, task in self.staged_alerts.items():
+            if task in superseded_tasks:
+                LOG.info( f'Cancelling staged event alert superseded by new events: {key}' )
+                self.staged_alert_keys.discard( key )
+                task.cancel()
+
+        if self.first_alert:
+            self._schedule_event_alerts( diablo_events_to_alerts( now, now, events ), now )
+            self.first_alert = False
+
+        for batch in batch_event_alerts( alerts, ALERT_BATCH_WINDOW ):
+            async def stage_alerts( batch: list[ DiabloEventAlert ] = batch ):
+                self._schedule_event_alerts( batch, batch[ 0 ].alert_time )
+
+            self.alert_scheduler.schedule( ( type( batch[ 0 ].event ).__name__, batch[ 0 ].alert_time ), batch[ 0 ].alert_time - ALERT_STAGING_LEAD, stage_alerts )
+
+        async def roll_predictions():
+            self._reschedule_event_alerts()
 
-        self.last_alert_time = now
-        self.first_alert = False
+        next_event_time = min( diablo_event_times( now, events ) )
+        self.alert_scheduler.schedule( 'roll-predictions', next_event_time + PREDICTION_ROLL_DELAY, roll_predictions )
 
-    @events_alerter.before_loop
-    async def before_events_alerter( self ):
-        await self.bot.wait_until_ready()
+        LOG.debug( f'Rescheduled Diablo event alerts: pending={self.alert_scheduler.pending}, next={self.alert_scheduler.next_deadline()}' )
 
-        await self.events_retrieved.wait()
+    async def cog_unload( self ):
+        self.events_retriever.cancel()
+        self.alert_scheduler.stop()
+
+        if self.events_client is not None:
+            await self.events_client.close()
+
+        for task in self.staged_alerts.values():
+            task.cancel()
+
+        for task in self.segment_prewarms:
+            task.cancel()
+
+    def set_events( self, events: DiabloEvents ):
+        if not self.bot.is_ready():
+            self.pending_events = events
+            return
+
+        if events != self.events:
+            LOG.debug( f'New Diablo events retrieved: {events}' )
+            self.events = events
+            self._reschedule_event_alerts()
+            self._queue_segments_prewarm( events )
+
+    @commands.Cog.listener()
+    async def on_ready( self ):
+        if self.pending_events is not None:
+            events, self.pending_events = self.pending_events, None
+            self.set_events( events )
 
     @tasks.loop( minutes=1 )
     async def events_retriever( self ):
+        interval = await self.poll_events()
+
+        LOG.debug( f'Next Diablo events poll in {interval}' )
+        self.events_retriever.change_interval( seconds=interval.total_seconds() )
+
+    async def poll_events( self ) -> timedelta:
+        assert self.events_client is not None
+
         LOG.debug( f'Retrieving Diablo events: {datetime.now( tz=timezone.utc )}' )
 
         try:
-            events = await get_diablo_events()
-            if events != self.events:
-                LOG.debug( f'New Diablo events retrieved: {events}' )
-                self.events = events
-                self.events_retrieved.set()
+            events = await self.events_client.get_events()
+
+            stats = self.events_client.stats
+            LOG.debug( f'Diablo events poll: response_time={stats.response_times[ -1 ]:.3f}s, requests={stats.requests}, not_modified={stats.not_modified}, bytes_received={stats.bytes_received}' )
+
+            self.set_events( events )
+
+            now = datetime.now( tz=timezone.utc )
+            interval = self.poll_interval.record_success( now, predict_transition_times( events, now ) )
         except Exception as ex:
-            LOG.warning( f'Failed to retrieve Diablo events', exc_info=ex )
+            interval = self.poll_interval.record_failure()
+            LOG.warning( f'Failed to retrieve Diablo events (failure streak: {self.poll_interval.failure_streak})', exc_info=ex )
+
+        return interval
 
     @events_retriever.before_loop
     async def before_events_retriever( self ):
@@ -0,0 +1,98 @@
+import dataclasses
+import math
+
+from datetime import datetime, timedelta, timezone
+
+from diablo_events import DiabloBossEvent, DiabloEvents, DiabloHelltideEvent, DiabloLegionEvent
+
+HELLTIDE_INTERVAL = timedelta( hours=2, minutes=15 )
+DEFAULT_LEGION_INTERVAL = timedelta( minutes=25 )
+DEFAULT_BOSS_INTERVAL = timedelta( hours=3, minutes=30 )
+
+UNKNOWN_BOSS_NAME = 'The world boss'
+
+def _next_spawn_index( now: int, expected: int, next_expected: int, interval: int ) -> int:
+    if now < next_expected:
+        return 1
+    return math.floor( ( now - next_expected ) / interval ) + 2
+
+def _spawn_time( index: int, expected: int, next_expected: int, interval: int ) -> int:
+    if index == 0:
+        return expected
+    return next_expected + ( index - 1 ) * interval
+
+def _spawn_interval( expected: int, next_expected: int, default: timedelta ) -> int:
+    interval = next_expected - expected
+    if interval <= 0:
+        interval = int( default.total_seconds() )
+    return interval
+
+def predict_boss_event( boss: DiabloBossEvent, now: int ) -> DiabloBossEvent:
+    if boss.timestamp > now or boss.expected > now:
+        return boss
+
+    interval = _spawn_interval( boss.expected, boss.nextExpected, DEFAULT_BOSS_INTERVAL )
+    index = _next_spawn_index( now, boss.expected, boss.nextExpected, interval )
+
+    names = ( boss.expectedName, boss.nextExpectedName )
+
+    def spawn_name( i: int ) -> str:
+        return names[ i ] if i < len( names ) else UNKNOWN_BOSS_NAME
+
+    return DiabloBossEvent(
+        name=spawn_name( index - 1 ),
+        expectedName=spawn_name( index ),
+        nextExpectedName=spawn_name( index + 1 ),
+        timestamp=_spawn_time( index - 1, boss.expected, boss.nextExpected, interval ),
+        expected=_spawn_time( index, boss.expected, boss.nextExpected, interval ),
+        nextExpected=_spawn_time( index + 1, boss.expected, boss.nextExpected, interval ),
+        territory='',
+        zone='',
+    )
+
+def predict_legion_event( legion: DiabloLegionEvent, now: int ) -> DiabloLegionEvent:
+    if legion.timestamp > now or legion.expected > now:
+        return legion
+
+    interval = _spawn_interval( legion.expected, legion.nextExpected, DEFAULT_LEGION_INTERVAL )
+    index = _next_spawn_index( now, legion.expected, legion.nextExpected, interval )
+
+    return DiabloLegionEvent(
+        timestamp=_spawn_time( index - 1, legion.expected, legion.nextExpected, interval ),
+        expected=_spawn_time( index, legion.expected, legion.nextExpected, interval ),
+        nextExpected=_spawn_time( index + 1, legion.expected, legion.nextExpected, interval ),
+        territory='',
+        zone='',
+    )
+
+def predict_helltide_event( helltide: DiabloHelltideEvent, now: int ) -> DiabloHelltideEvent:
+    interval = int( HELLTIDE_INTERVAL.total_seconds() )
+    if helltide.timestamp + interval > now:
+        return helltide
+
+    cycles = math.floor( ( now - helltide.timestamp ) / interval )
+
+    return dataclasses.replace( helltide, timestamp=helltide.timestamp + cycles * interval, zone='' )
+
+def predict_diablo_events( events: DiabloEvents, now: datetime ) -> DiabloEvents:
+    now_timestamp = int( now.timestamp() )
+
+    return DiabloEvents(
+        boss=predict_boss_event( events.boss, now_timestamp ),
+        legion=predict_legion_event( events.legion, now_timestamp ),
+        helltide=predict_helltide_event( events.helltide, now_timestamp ),
+    )
+
+def predict_transition_times( events: DiabloEvents, now: datetime ) -> list[ datetime ]:
+    predicted = predict_diablo_events( events, now )
+
+    timestamps = (
+        predicted.boss.timestamp,
+        predicted.boss.expected,
+        predicted.legion.timestamp,
+        predicted.legion.expected,
+        predicted.helltide.timestamp,
+        predicted.helltide.timestamp + int( HELLTIDE_INTERVAL.total_seconds() ),
+    )
+
+    return sorted( datetime.fromtimestamp( t, tz=timezone.utc ) for t in timestamps )
@@ -0,0 +1,400 @@
+import asyncio
+import bisect
+import email.utils
+import hashlib
+import itertools
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Callable, cast
+
+import discord
+
+from aiohttp import web
+from discord.ext import commands
+from discord.http import HTTPClient
+from discord.state import ConnectionState
+from discord.utils import MISSING
+
+from channel_registry import ChannelRegistry
+from intro_sounds import IntroSoundStore
+from playback import PlaybackManager
+from sound_cache import SoundCache
+from tts import TTS, FakeTTSBackend
+from voice_connections import VoiceConnectionManager
+
+OPUS_FRAME_DURATION = 0.02
+OPUS_SILENCE_FRAME = b'\xf8\xff\xfe'
+
+FAKE_FILE_FRAMES = 50
+FAKE_PCM_BYTES_PER_FRAME = 882
+
+_snowflakes = itertools.count( 1100000000000000000 )
+
+def next_snowflake() -> int:
+    return next( _snowflakes )
+
+def fake_decode_opus_frames( audio: Path | bytes ) -> tuple[ bytes, ... ]:
+    if isinstance( audio, bytes ):
+        frame_count = max( 1, len( audio ) // FAKE_PCM_BYTES_PER_FRAME )
+    else:
+        frame_count = FAKE_FILE_FRAMES
+    return ( OPUS_SILENCE_FRAME, ) * frame_count
+
+def first_frame_latencies( start_times: list[ float ], first_frame_times: list[ float ] ) -> tuple[ list[ float ], int ]:
+    first_frame_times = sorted( first_frame_times )
+
+    latencies: list[ float ] = []
+    missed = 0
+    for start_time in start_times:
+        index = bisect.bisect_left( first_frame_times, start_time )
+        if index < len( first_frame_times ):
+            latencies.append( first_frame_times[ index ] - start_time )
+        else:
+            missed += 1
+    return latencies, missed
+
+class FakeUser:
+    def __init__( self, name: str, user_id: int | None = None, bot: bool = False ) -> None:
+        self.id = user_id if user_id is not None else next_snowflake()
+        self.name = name
+        self.bot = bot
+
+    def __str__( self ) -> str:
+        return self.name
+
+class FakeVoiceState:
+    def __init__( self, channel: 'FakeVoiceChannel | None' ) -> None:
+        self.channel = channel
+
+class FakeMember:
+    def __init__( self, guild: 'FakeGuild', name: str, member_id: int | None = None, nick: str | None = None, bot: bool = False ) -> None:
+        self.id = member_id if member_id is not None else next_snowflake()
+        self.guild = guild
+        self.name = name
+        self.nick = nick
+        self.bot = bot
+        self.voice: FakeVoiceState | None = None
+
+    @property
+    def display_name( self ) -> str:
+        return self.nick or self.name
+
+    @property
+    def mention( self ) -> str:
+        return f'<@{self.id}>'
+
+    def __eq__( self, other: object ) -> bool:
+        return isinstance( other, FakeMember ) and other.id == self.id and other.guild is self.guild
+
+    def __hash__( self ) -> int:
+        return hash( ( self.guild.id, self.id ) )
+
+    def as_member( self ) -> discord.Member:
+        return cast( discord.Member, self )
+
+    def __repr__( self ) -> str:
+        return f'<FakeMember id={self.id} name={self.name!r} bot={self.bot}>'
+
+def voice_state_update( member: FakeMember, before: FakeVoiceState, after: FakeVoiceState ) -> tuple[ discord.Member, discord.VoiceState, discord.VoiceState ]:
+    return cast( tuple[ discord.Member, discord.VoiceState, discord.VoiceState ], ( member, before, after ) )
+
+class FakeVoiceClient( discord.VoiceClient ):
+    def __init__( self, channel: 'FakeVoiceChannel', frame_interval: float = OPUS_FRAME_DURATION ) -> None:
+        # VoiceClient.__init__ needs PyNaCl and a gateway connection, so only set up the VoiceProtocol state
+        discord.VoiceProtocol.__init__( self, channel.fake_guild.bot.as_bot(), channel )
+        self.fake_guild = channel.fake_guild
+        self.frame_interval = frame_interval
+        self.connected = True
+
+        self.player: threading.Thread | None = None
+        self.playing = False
+        self.stop_event = threading.Event()
+
+        self.plays = 0
+        self.frames_played = 0
+        self.first_frames: list[ tuple[ float, int ] ] = []
+
+    def is_connected( self ) -> bool:
+        return self.connected
+
+    def is_playing( self ) -> bool:
+        return self.playing
+
+    def is_paused( self ) -> bool:
+        return False
+
+    def play( self, source: discord.AudioSource, *, after: Callable[ [ Exception | None ], Any ] | None = None ) -> None:
+        if not self.connected:
+            raise discord.ClientException( 'Not connected to voice.' )
+        if self.is_playing():
+            raise discord.ClientException( 'Already playing audio.' )
+
+        self.plays += 1
+        self.stop_event = threading.Event()
+        self.playing = True
+        self.player = threading.Thread( target=self._play, args=( source, after, self.stop_event ), name=f'fake-player-{self.channel.id}', daemon=True )
+        self.player.start()
+
+    def _play( self, source: discord.AudioSource, after: Callable[ [ Exception | None ], Any ] | None, stop_event: threading.Event ):
+        error: Exception | None = None
+        first_frame = True
+        try:
+            next_frame_time = time.perf_counter()
+            while not stop_event.is_set():
+                frame = source.read()
+                if not frame:
+                    break
+
+                if first_frame:
+                    self.first_frames.append( ( time.perf_counter(), self.channel.id ) )
+                    first_frame = False
+                self.frames_played += 1
+
+                if self.frame_interval > 0:
+                    next_frame_time += self.frame_interval
+                    delay = next_frame_time - time.perf_counter()
+                    if delay > 0:
+                        stop_event.wait( delay )
+        except Exception as ex:
+            error = ex
+        finally:
+            source.cleanup()
+            self.playing = False
+
+        if after is not None:
+            after( error )
+
+    def stop( self ) -> None:
+        self.stop_event.set()
+
+    async def disconnect( self, *, force: bool = False ) -> None:
+        self.stop()
+        self.connected = False
+        self.fake_guild.voice_client_disconnected( self )
+
+class FakeVoiceChannel( discord.VoiceChannel ):
+    def __init__( self, guild: 'FakeGuild', name: str, channel_id: int | None = None ) -> None:
+        super().__init__( state=guild.bot.state, guild=guild.as_guild(), data={
+            'id': channel_id if channel_id is not None else next_snowflake(),
+            'type': 2,
+            'name': name,
+            'guild_id': guild.id,
+            'position': len( guild.channels ),
+            'permission_overwrites': [],
+            'nsfw': False,
+            'parent_id': None,
+            'bitrate': 64000,
+            'user_limit': 0,
+        } )
+        self.fake_guild = guild
+        self.member_list: list[ FakeMember ] = []
+
+    @property
+    def members( self ) -> list[ discord.Member ]:
+        return [ m.as_member() for m in self.member_list ]
+
+    async def connect( self, *, timeout: float = 60.0, reconnect: bool = True, self_deaf: bool = False, self_mute: bool = False, **kwargs: Any ) -> FakeVoiceClient:
+        guild = self.fake_guild
+        if guild.voice_client is not None:
+            raise discord.ClientException( 'Already connected to a voice channel.' )
+
+        if guild.handshake_latency > 0:
+            await asyncio.sleep( guild.handshake_latency )
+
+        voice_client = FakeVoiceClient( self, frame_interval=guild.frame_interval )
+        guild.voice_client = voice_client
+        guild.voice_clients.append( voice_client )
+        guild.move_member( guild.me, self )
+        return voice_client
+
+    def __repr__( self ) -> str:
+        return f'<FakeVoiceChannel id={self.id} name={self.name!r}>'
+
+class FakeGuild:
+    def __init__( self, bot: 'FakeBot', name: str, guild_id: int | None = None, handshake_latency: float = 0.0, frame_interval: float = OPUS_FRAME_DURATION ) -> None:
+        self.bot = bot
+        self.id = guild_id if guild_id is not None else next_snowflake()
+        self.name = name
+        self.handshake_latency = handshake_latency
+        self.frame_interval = frame_interval
+
+        self.members: list[ FakeMember ] = []
+        self.channels: dict[ int, FakeVoiceChannel ] = {}
+        self.voice_client: FakeVoiceClient | None = None
+        self.voice_clients: list[ FakeVoiceClient ] = []
+
+        assert bot.user is not None
+        self.me = FakeMember( self, bot.user.name, member_id=bot.user.id, bot=True )
+
+    def as_guild( self ) -> discord.Guild:
+        return cast( discord.Guild, self )
+
+    def first_frame_times( self, channel_id: int | None = None ) -> list[ float ]:
+        return [ t for vc in self.voice_clients for t, cid in vc.first_frames if channel_id is None or cid == channel_id ]
+
+    @property
+    def member_count( self ) -> int:
+        return len( self.members )
+
+    def get_channel( self, channel_id: int ) -> FakeVoiceChannel | None:
+        return self.channels.get( channel_id )
+
+    def get_member( self, member_id: int ) -> FakeMember | None:
+        return next( ( m for m in self.members if m.id == member_id ), None )
+
+    def create_voice_channel( self, name: str, channel_id: int | None = None ) -> FakeVoiceChannel:
+        channel = FakeVoiceChannel( self, name, channel_id=channel_id )
+        self.channels[ channel.id ] = channel
+        self.bot.channels[ channel.id ] = channel
+        return channel
+
+    def add_member( self, name: str, member_id: int | None = None, nick: str | None = None, bot: bool = False ) -> FakeMember:
+        member = FakeMember( self, name, member_id=member_id, nick=nick, bot=bot )
+        self.members.append( member )
+        return member
+
+    def move_member( self, member: FakeMember, channel: FakeVoiceChannel | None ) -> tuple[ FakeVoiceState, FakeVoiceState ]:
+        before = FakeVoiceState( member.voice.channel if member.voice else None )
+        if before.channel is not None:
+            before.channel.member_list.remove( member )
+
+        if channel is not None:
+            channel.member_list.append( member )
+            member.voice = FakeVoiceState( channel )
+        else:
+            member.voice = None
+
+        return before, FakeVoiceState( channel )
+
+    async def change_voice_state( self, *, channel: FakeVoiceChannel | None, self_mute: bool = False, self_deaf: bool = False ) -> None:
+        if self.handshake_latency > 0:
+            await asyncio.sleep( self.handshake_latency )
+
+        if self.voice_client is None:
+            return
+
+        if channel is None:
+            await self.voice_client.disconnect()
+            return
+
+        self.voice_client.channel = channel
+        self.move_member( self.me, channel )
+
+    def voice_client_disconnected( self, voice_client: FakeVoiceClient ):
+        if self.voice_client is voice_client:
+            self.voice_client = None
+            self.move_member( self.me, None )
+
+    def __repr__( self ) -> str:
+        return f'<FakeGuild id={self.id} name={self.name!r}>'
+
+class FakeBot:
+    def __init__( self, name: str = 'Dabs Bot' ) -> None:
+        self.user: FakeUser | None = FakeUser( name, bot=True )
+        self.guilds: list[ FakeGuild ] = []
+        self.channels: dict[ int, FakeVoiceChannel ] = {}
+
+        self.state = ConnectionState( dispatch=self.dispatch, handlers={}, hooks={}, http=HTTPClient( MISSING ) )
+
+    def as_bot( self ) -> commands.Bot:
+        return cast( commands.Bot, self )
+
+    def dispatch( self, event_name: str, /, *args: Any, **kwargs: Any ) -> None:
+        pass
+
+    def add_guild( self, name: str, guild_id: int | None = None, handshake_latency: float = 0.0, frame_interval: float = OPUS_FRAME_DURATION ) -> FakeGuild:
+        guild = FakeGuild( self, name, guild_id=guild_id, handshake_latency=handshake_latency, frame_interval=frame_interval )
+        self.guilds.append( guild )
+        return guild
+
+    def is_ready( self ) -> bool:
+        return True
+
+    async def wait_until_ready( self ) -> None:
+        pass
+
+    def get_guild( self, guild_id: int ) -> FakeGuild | None:
+        return next( ( g for g in self.guilds if g.id == guild_id ), None )
+
+    def get_channel( self, channel_id: int ) -> FakeVoiceChannel | None:
+        return self.channels.get( channel_id )
+
+class FakeDeployment:
+    def __init__( self, root_dir: Path, frame_interval: float = OPUS_FRAME_DURATION ) -> None:
+        self.frame_interval = frame_interval
+
+        self.bot = FakeBot()
+        self.registry = ChannelRegistry( root_dir / 'channels.sqlite3' )
+        self.registry.load()
+
+        self.tts = TTS( backend=FakeTTSBackend() )
+        self.sound_cache = SoundCache( decoder=fake_decode_opus_frames )
+        self.intro_sounds = IntroSoundStore( self.tts, root_dir / 'intros' )
+        self.welcome_sounds = IntroSoundStore( self.tts, root_dir / 'welcomes' )
+        self.voice_connections = VoiceConnectionManager( self.bot.as_bot() )
+        self.playback = PlaybackManager()
+
+        self.channels: list[ FakeVoiceChannel ] = []
+
+    async def register_channels( self ):
+        for channel in self.channels:
+            await self.registry.register( channel.fake_guild.id, channel.id )
+
+    def is_playing( self ) -> bool:
+        return any( g.voice_client is not None and g.voice_client.is_playing() for g in self.bot.guilds )
+
+class StubEventsServer:
+    def __init__( self ) -> None:
+        self.body: bytes | None = None
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.requests = 0
+        self.request_headers: list[ dict[ str, str ] ] = []
+        self.failures_pending = 0
+
+        self.runner: web.AppRunner | None = None
+        self.url = ''
+
+    def set_body( self, body: bytes, etag: str | None = None ):
+        self.body = body
+        self.etag = etag or f'"{hashlib.sha1( body ).hexdigest()[ :16 ]}"'
+        self.last_modified = email.utils.formatdate( usegmt=True )
+
+    def _not_modified( self, request: web.Request ) -> bool:
+        if 'If-None-Match' in request.headers:
+            return request.headers[ 'If-None-Match' ] == self.etag
+        return request.headers.get( 'If-Modified-Since' ) == self.last_modified
+
+    async def _handle_events( self, request: web.Request ) -> web.Response:
+        self.requests += 1
+        self.request_headers.append( dict( request.headers ) )
+        if self.failures_pending > 0:
+            self.failures_pending -= 1
+            return web.Response( status=503 )
+        if self.body is None or self.etag is None or self.last_modified is None:
+            return web.Response( status=503 )
+
+        headers = { 'ETag': self.etag, 'Last-Modified': self.last_modified }
+        if self._not_modified( request ):
+            return web.Response( status=304, headers=headers )
+        return web.Response( body=self.body, content_type='application/json', headers=headers )
+
+    async def start( self ):
+        app = web.Application()
+        app.router.add_get( '/events.json', self._handle_events )
+
+        self.runner = web.AppRunner( app, access_log=None )
+        await self.runner.setup()
+
+        site = web.TCPSite( self.runner, '127.0.0.1', 0 )
+        await site.start()
+
+        host, port = self.runner.addresses[ 0 ][ :2 ]
+        self.url = f'http://{host}:{port}/events.json'
+
+    async def stop( self ):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
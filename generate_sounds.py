@@ -1,12 +1,19 @@
 import argparse
 import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
 
 from pathlib import Path
-from typing import List, NamedTuple
+from typing import Dict, List, NamedTuple
 
-from constants import ELIXIR_ALERT_SOUNDS_DIR, INTRO_SOUNDS_DIR, WELCOME_SOUNDS_DIR
+from constants import ELIXIR_ALERT_SOUNDS_DIR, INTRO_SOUNDS_DIR, SOUNDS_MANIFEST_PATH, WELCOME_SOUNDS_DIR
 from tts import TTS
 
+DEFAULT_CONCURRENCY = 4
+
 class TtsConfig( NamedTuple ):
     path: Path
     text: str
@@ -85,18 +92,84 @@ ELIXIR_ALERTS: List[ TtsConfig ] = [
     ),
 ]
 
-async def generate_tts_mp3s( tts: TTS, tts_configs: List[ TtsConfig ] ):
-    for tts_config in tts_configs:
-        print( 'Generating', tts_config.path )
-        audio_content = await tts.generate_tts(
-            text=tts_config.text,
-            language_code=tts_config.language_code,
-            voice_name=tts_config.voice_name,
-            pitch=tts_config.pitch,
-            speed=tts_config.speed,
-        )
+def tts_config_hash( tts_config: TtsConfig ) -> str:
+    fields = [ tts_config.text, tts_config.language_code, tts_config.voice_name, tts_config.pitch, tts_config.speed ]
+    return hashlib.sha256( json.dumps( fields, ensure_ascii=False ).encode( 'utf-8' ) ).hexdigest()
+
+def _manifest_key( manifest_path: Path, path: Path ) -> str:
+    return Path( os.path.relpath( path, manifest_path.parent ) ).as_posix()
+
+def load_manifest( manifest_path: Path ) -> Dict[ str, str ]:
+    try:
+        return json.loads( manifest_path.read_text( encoding='utf-8' ) )
+    except FileNotFoundError:
+        return {}
+
+def write_atomic( path: Path, content: bytes ):
+    path.parent.mkdir( parents=True, exist_ok=True )
+    tmp_path = path.with_name( f'.{path.name}.{os.getpid()}.tmp' )
+    tmp_path.write_bytes( content )
+    os.replace( tmp_path, path )
+
+def save_manifest( manifest_path: Path, manifest: Dict[ str, str ] ):
+    write_atomic( manifest_path, ( json.dumps( manifest, indent=2, sort_keys=True ) + '\n' ).encode( 'utf-8' ) )
+
+async def generate_tts_mp3s(
+    tts: TTS,
+    tts_configs: List[ TtsConfig ],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    force: bool = False,
+    manifest_path: Path = SOUNDS_MANIFEST_PATH,
+) -> int:
+    start = time.perf_counter()
+
+    manifest = load_manifest( manifest_path )
+    semaphore = asyncio.Semaphore( concurrency )
+
+    timings: List[ tuple[ float, Path ] ] = []
+    skipped: List[ Path ] = []
+    failed: List[ Path ] = []
 
-        tts_config.path.write_bytes( audio_content )
+    async def generate( tts_config: TtsConfig ):
+        key = _manifest_key( manifest_path, tts_config.path )
+        config_hash = tts_config_hash( tts_config )
+        if not force and manifest.get( key ) == config_hash and tts_config.path.exists():
+            skipped.append( tts_config.path )
+            return
+
+        async with semaphore:
+            print( 'Generating', tts_config.path )
+            generate_start = time.perf_counter()
+            try:
+                audio_content = await tts.generate_tts(
+                    text=tts_config.text,
+                    language_code=tts_config.language_code,
+                    voice_name=tts_config.voice_name,
+                    pitch=tts_config.pitch,
+                    speed=tts_config.speed,
+                )
+            except Exception as ex:
+                print( 'Failed to generate', tts_config.path, '-', ex )
+                failed.append( tts_config.path )
+                return
+
+        await asyncio.to_thread( write_atomic, tts_config.path, audio_content )
+        manifest[ key ] = config_hash
+        timings.append( ( time.perf_counter() - generate_start, tts_config.path ) )
+
+    try:
+        await asyncio.gather( *( generate( c ) for c in tts_configs ) )
+    finally:
+        if timings:
+            save_manifest( manifest_path, manifest )
+
+    elapsed = time.perf_counter() - start
+
+    for duration, path in sorted( timings, key=lambda t: t[ 0 ], reverse=True ):
+        print( f'  {duration * 1000:8.1f} ms  {path}' )
+    print( f'Generated {len( timings )}, skipped {len( skipped )} unchanged, failed {len( failed )} in {elapsed:.2f}s (concurrency {concurrency})' )
+
+    return len( failed )
 
 async def main():
     parser = argparse.ArgumentParser()
@@ -104,18 +177,25 @@ async def main():
     parser.add_argument( '--custom-intros', action='store_true' )
     parser.add_argument( '--elixir-alerts', action='store_true' )
     parser.add_argument( '--all', action='store_true' )
+    parser.add_argument( '--concurrency', type=int, default=DEFAULT_CONCURRENCY )
+    parser.add_argument( '--force', action='store_true', help='regenerate assets even if their config is unchanged' )
     args = parser.parse_args()
 
     tts = TTS()
 
+    tts_configs: List[ TtsConfig ] = []
+
     if args.default_intros or args.all:
-        await generate_tts_mp3s( tts, DEFAULT_INTROS )
+        tts_configs.extend( DEFAULT_INTROS )
 
     if args.custom_intros or args.all:
-        await generate_tts_mp3s( tts, CUSTOM_INTROS )
+        tts_configs.extend( CUSTOM_INTROS )
 
     if args.elixir_alerts or args.all:
-        await generate_tts_mp3s( tts, ELIXIR_ALERTS )
+        tts_configs.extend( ELIXIR_ALERTS )
+
+    if await generate_tts_mp3s( tts, tts_configs, concurrency=args.concurrency, force=args.force ) > 0:
+        sys.exit( 1 )
 
 if __name__ == '__main__':
-    asyncio.run( main() )
\ No newline at end of file
+    asyncio.run( main() )
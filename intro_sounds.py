@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable, TypeVar
+
+from tts import TTS
+
+LOG = logging.getLogger( __name__ )
+
+T = TypeVar( 'T' )
+
+DEFAULT_SOUND_NAME = 'default.mp3'
+GENERATED_SOUND_PREFIX = 'tts-'
+
+DEFAULT_MAX_STORE_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_SOUND_AGE = timedelta( days=90 )
+
+class IntroSoundStore:
+    def __init__(
+        self,
+        tts: TTS,
+        sounds_dir: Path,
+        curated_paths: Iterable[ Path ] = (),
+        language_code: str = 'en-US',
+        voice_name: str = 'en-US-Neural2-C',
+        max_bytes: int = DEFAULT_MAX_STORE_BYTES,
+        max_age: timedelta = DEFAULT_MAX_SOUND_AGE,
+        executor: ThreadPoolExecutor | None = None,
+    ) -> None:
+        self.tts = tts
+        self.sounds_dir = sounds_dir
+        self.language_code = language_code
+        self.voice_name = voice_name
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.executor = executor or ThreadPoolExecutor( max_workers=2, thread_name_prefix='intro-sounds' )
+
+        self.curated_paths = set( curated_paths )
+        self.curated_paths.add( sounds_dir / DEFAULT_SOUND_NAME )
+
+        self.index: set[ str ] | None = None
+        self.index_lock = asyncio.Lock()
+        self.pending: dict[ Path, asyncio.Task[ Path ] ] = {}
+
+    @property
+    def default_sound_path( self ) -> Path:
+        return self.sounds_dir / DEFAULT_SOUND_NAME
+
+    async def _run( self, func: Callable[ ..., T ], *args: Any ) -> T:
+        return await asyncio.get_running_loop().run_in_executor( self.executor, func, *args )
+
+    def _sound_path( self, text: str ) -> Path:
+        key = hashlib.sha256( f'{self.language_code}\0{self.voice_name}\0{text}'.encode( 'utf-8' ) ).hexdigest()[ :24 ]
+        return self.sounds_dir / f'{GENERATED_SOUND_PREFIX}{key}.mp3'
+
+    def _list_sounds( self ) -> set[ str ]:
+        self.sounds_dir.mkdir( parents=True, exist_ok=True )
+        return { p.name for p in self.sounds_dir.glob( '*.mp3' ) }
+
+    async def _ensure_index( self ) -> set[ str ]:
+        if self.index is None:
+            async with self.index_lock:
+                if self.index is None:
+                    self.index = await self._run( self._list_sounds )
+        return self.index
+
+    @staticmethod
+    def _write_atomic( path: Path, content: bytes ):
+        tmp_path = path.with_name( f'.{path.name}.{os.getpid()}.tmp' )
+        tmp_path.write_bytes( content )
+        os.replace( tmp_path, path )
+
+    @staticmethod
+    def _touch( path: Path ):
+        try:
+            os.utime( path )
+        except FileNotFoundError:
+            pass
+
+    async def _generate( self, path: Path, text: str ) -> Path:
+        LOG.debug( f'Generating intro sound: "{text}" -> {path.name}' )
+        audio_content = await self.tts.generate_tts( text, language_code=self.language_code, voice_name=self.voice_name )
+        await self._run( self._write_atomic, path, audio_content )
+
+        index = await self._ensure_index()
+        index.add( path.name )
+
+        return path
+
+    async def get_curated_sound( self, member_id: int ) -> Path | None:
+        path = self.sounds_dir / f'{member_id}.mp3'
+        if path not in self.curated_paths:
+            return None
+        if path.name not in await self._ensure_index():
+            LOG.debug( f'Curated intro sound is missing, falling back to TTS: {path}' )
+            return None
+        return path
+
+    async def has_sound( self, text: str ) -> bool:
+        return self._sound_path( text ).name in await self._ensure_index()
+
+    async def get_sound( self, member_id: int, text: str ) -> Path:
+        curated_path = await self.get_curated_sound( member_id )
+        if curated_path is not None:
+            return curated_path
+
+        path = self._sound_path( text )
+        if path.name in await self._ensure_index():
+            asyncio.get_running_loop().run_in_executor( self.executor, self._touch, path )
+            return path
+
+        task = self.pending.get( path )
+        if task is None:
+            task = asyncio.create_task( self._generate( path, text ) )
+            self.pending[ path ] = task
+            task.add_done_callback( lambda _: self.pending.pop( path, None ) )
+
+        try:
+            return await asyncio.shield( task )
+        except Exception as ex:
+            LOG.error( f'Failed to generate TTS for "{text}":', exc_info=ex )
+
+        return self.default_sound_path
+
+    def _collect_garbage( self ) -> list[ str ]:
+        now = time.time()
+
+        candidates: list[ tuple[ float, int, Path ] ] = []
+        for path in self.sounds_dir.glob( '*.mp3' ):
+            if path in self.curated_paths:
+                continue
+            stat = path.stat()
+            candidates.append( ( stat.st_mtime, stat.st_size, path ) )
+
+        candidates.sort()
+        total_bytes = sum( size for _, size, _ in candidates )
+
+        removed: list[ str ] = []
+        for mtime, size, path in candidates:
+            if total_bytes <= self.max_bytes and now - mtime <= self.max_age.total_seconds():
+                continue
+            path.unlink( missing_ok=True )
+            total_bytes -= size
+            removed.append( path.name )
+
+        return removed
+
+    async def collect_garbage( self ) -> int:
+        removed = await self._run( self._collect_garbage )
+
+        index = await self._ensure_index()
+        index.difference_update( removed )
+
+        if removed:
+            LOG.info( f'Removed {len( removed )} intro sound(s) from {self.sounds_dir}' )
+
+        return len( removed )
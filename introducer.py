@@ -1,55 +1,283 @@
 import asyncio
 import logging
 import re
+import time
 
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Coroutine
 
 import discord
 
-from discord.ext import commands
+from discord.ext import tasks, commands
 
-from constants import INTRO_SOUNDS_DIR, WELCOME_SOUNDS_DIR
+from channel_registry import ChannelRegistry
+from intro_sounds import IntroSoundStore
+from metrics import VOICE_EVENT_TO_AUDIO_LATENCY
+from playback import PlaybackManager, PlaybackPriority
+from sound_cache import CachedOpusAudio, SoundCache
 from tts import TTS
-from utils import get_channel_voice_client, join_voice_chat, play_voice_channel_audio
+from voice_connections import VoiceConnectionManager
 
 LOG = logging.getLogger( __name__ )
 
-INTRO_DELAY = 0.5
+INTRO_DEBOUNCE_WINDOW = 1.0
+INTRO_MAX_BATCH_SIZE = 5
+INTRO_MAX_WAIT = 30
+INTRO_TTS_DEADLINE = 2.0
+
+PREWARM_CONCURRENCY = 2
+PREWARM_REQUEST_INTERVAL = 0.5
+PREWARM_BUSY_BACKOFF = 1.0
 
 MEMBER_NAME_RE = re.compile( r'\d*$' )
 
+VoiceChannel = discord.VoiceChannel | discord.StageChannel
+
+def get_member_name( member: discord.Member ) -> str:
+    return MEMBER_NAME_RE.sub( '', member.nick or member.display_name )
+
+def format_member_names( names: list[ str ] ) -> str:
+    if len( names ) == 1:
+        return names[ 0 ]
+    return f'{", ".join( names[ :-1 ] )} and {names[ -1 ]}'
+
+def _log_task_failure( task: asyncio.Task[ Any ] ):
+    if not task.cancelled() and task.exception() is not None:
+        LOG.debug( f'Intro background task failed: {task.exception()!r}' )
+
+@dataclass
+class PendingIntroBatch:
+    channel: VoiceChannel
+    welcome: bool
+    voice_client: asyncio.Task[ discord.VoiceClient ]
+    first_intro: asyncio.Task[ tuple[ bytes, ... ] ]
+    members: list[ discord.Member ] = field( default_factory=list )
+    flusher: asyncio.Task[ None ] | None = None
+    started_at: float = field( default_factory=time.perf_counter )
+
 class IntroducerCog( commands.Cog ):
-    def __init__( self, bot: commands.Bot, tts: TTS ) -> None:
+    def __init__(
+        self,
+        bot: commands.Bot,
+        registry: ChannelRegistry,
+        tts: TTS,
+        sound_cache: SoundCache,
+        intro_sounds: IntroSoundStore,
+        welcome_sounds: IntroSoundStore,
+        voice_connections: VoiceConnectionManager,
+        playback: PlaybackManager,
+        debounce_window: float = INTRO_DEBOUNCE_WINDOW,
+        max_batch_size: int = INTRO_MAX_BATCH_SIZE,
+        prewarm_concurrency: int = PREWARM_CONCURRENCY,
+        prewarm_request_interval: float = PREWARM_REQUEST_INTERVAL,
+    ) -> None:
         self.bot = bot
+        self.registry = registry
         self.tts = tts
+        self.sound_cache = sound_cache
+        self.intro_sounds = intro_sounds
+        self.welcome_sounds = welcome_sounds
+        self.voice_connections = voice_connections
+        self.playback = playback
+        self.debounce_window = debounce_window
+        self.max_batch_size = max_batch_size
+        self.prewarm_concurrency = prewarm_concurrency
+        self.prewarm_request_interval = prewarm_request_interval
 
-    async def _get_member_sound( self, tts_text_format: str, member: discord.Member, sounds_path: Path, default_sound: str ) -> Path:
-        sound_mp3_path = sounds_path / f'{member.id}.mp3'
-        if sound_mp3_path.is_file():
-            return sound_mp3_path
+        self.pending_intros: dict[ int, PendingIntroBatch ] = {}
+        self.intro_tasks: set[ asyncio.Task[ None ] ] = set()
 
-        member_name = MEMBER_NAME_RE.sub( '', member.nick or member.display_name )
-        tts_text = tts_text_format.format( name=member_name )
+        self.prewarm_queue: asyncio.Queue[ discord.Member ] = asyncio.Queue()
+        self.prewarm_queued: set[ tuple[ int, int ] ] = set()
+        self.prewarm_workers: list[ asyncio.Task[ None ] ] = []
+        self.prewarm_rate_lock = asyncio.Lock()
+        self.prewarm_next_request = 0.0
+        self.prewarmed_sounds = 0
+        self.prewarm_failures = 0
 
-        try:
-            LOG.debug( f'Generating sound for member {member.name}: "{tts_text_format}"' )
-            audio_content = await self.tts.generate_tts( tts_text, language_code='en-US', voice_name='en-US-Neural2-C' )
-            sound_mp3_path.write_bytes( audio_content )
-            return sound_mp3_path
-        except Exception as ex:
-            LOG.error( f'Failed to generate TTS for "{tts_text}":', exc_info=ex )
+        self.sound_garbage_collector.start()
 
-        return sounds_path / default_sound
+    def _get_member_sound_text( self, member: discord.Member, welcome: bool = False ) -> tuple[ IntroSoundStore, str ]:
+        if welcome:
+            return self.welcome_sounds, f'Welcome {get_member_name( member )}'
+        else:
+            return self.intro_sounds, f'{get_member_name( member )} has joined the chat'
 
     async def _get_intro_sound( self, member: discord.Member, welcome: bool = False ) -> Path:
+        store, text = self._get_member_sound_text( member, welcome=welcome )
+        return await store.get_sound( member.id, text )
+
+    async def _get_intro_frames( self, member: discord.Member, welcome: bool = False ) -> tuple[ bytes, ... ]:
+        return await self.sound_cache.get_frames( await self._get_intro_sound( member, welcome=welcome ) )
+
+    def _is_live_audio_pending( self ) -> bool:
+        return bool( self.pending_intros ) or self.playback.queue_depth() > 0
+
+    async def _wait_for_prewarm_slot( self ):
+        while self._is_live_audio_pending():
+            await asyncio.sleep( PREWARM_BUSY_BACKOFF )
+
+        async with self.prewarm_rate_lock:
+            loop = asyncio.get_running_loop()
+            delay = self.prewarm_next_request - loop.time()
+            if delay > 0:
+                await asyncio.sleep( delay )
+            self.prewarm_next_request = loop.time() + self.prewarm_request_interval
+
+    async def _prewarm_member( self, member: discord.Member ):
+        for welcome in ( False, True ):
+            store, text = self._get_member_sound_text( member, welcome=welcome )
+            if await store.get_curated_sound( member.id ) is not None or await store.has_sound( text ):
+                continue
+
+            await self._wait_for_prewarm_slot()
+            if await store.get_sound( member.id, text ) != store.default_sound_path:
+                self.prewarmed_sounds += 1
+            else:
+                self.prewarm_failures += 1
+
+    async def _prewarm_worker( self ):
+        while True:
+            member = await self.prewarm_queue.get()
+            self.prewarm_queued.discard( ( member.guild.id, member.id ) )
+            try:
+                await self._prewarm_member( member )
+            except Exception as ex:
+                LOG.warning( f'Failed to pre-warm intro sounds for {member.name} (ID: {member.id})', exc_info=ex )
+            finally:
+                self.prewarm_queue.task_done()
+
+    def _queue_prewarm( self, member: discord.Member ):
+        if member.bot:
+            return
+
+        key = ( member.guild.id, member.id )
+        if key in self.prewarm_queued:
+            return
+        self.prewarm_queued.add( key )
+        self.prewarm_queue.put_nowait( member )
+
+        if not self.prewarm_workers:
+            self.prewarm_workers = [ asyncio.create_task( self._prewarm_worker(), name=f'intro-prewarm-{i}' ) for i in range( self.prewarm_concurrency ) ]
+
+    def _queue_guild_prewarm( self, guild: discord.Guild ):
+        if not self.registry.get_guild_channel_ids( guild.id ):
+            return
+
+        LOG.info( f'Pre-warming intro sounds for {len( guild.members )} cached member(s) of guild ({guild.name} - {guild.id})' )
+        for member in guild.members:
+            self._queue_prewarm( member )
+
+    @commands.Cog.listener()
+    async def on_ready( self ):
+        for guild in self.bot.guilds:
+            self._queue_guild_prewarm( guild )
+
+    @commands.Cog.listener()
+    async def on_guild_join( self, guild: discord.Guild ):
+        self._queue_guild_prewarm( guild )
+
+    @commands.Cog.listener()
+    async def on_member_update( self, before: discord.Member, after: discord.Member ):
+        if get_member_name( before ) == get_member_name( after ):
+            return
+        if not self.registry.get_guild_channel_ids( after.guild.id ):
+            return
+
+        self._queue_prewarm( after )
+
+    @tasks.loop( hours=24 )
+    async def sound_garbage_collector( self ):
+        for store in ( self.intro_sounds, self.welcome_sounds ):
+            try:
+                await store.collect_garbage()
+            except Exception as ex:
+                LOG.warning( f'Failed to collect intro sound garbage: {store.sounds_dir}', exc_info=ex )
+
+    async def cog_unload( self ):
+        self.sound_garbage_collector.cancel()
+        for worker in self.prewarm_workers:
+            worker.cancel()
+
+    async def _get_group_intro_audio( self, members: list[ discord.Member ], welcome: bool = False ) -> CachedOpusAudio:
+        if len( members ) == 1:
+            return await self.sound_cache.get_audio( await self._get_intro_sound( members[ 0 ], welcome=welcome ) )
+
+        names = format_member_names( [ get_member_name( m ) for m in members ] )
         if welcome:
-            text_format = 'Welcome {name}'
-            sounds_dir = WELCOME_SOUNDS_DIR
+            tts_text = f'Welcome {names}'
+            default_sound_path = self.welcome_sounds.default_sound_path
         else:
-            text_format = '{name} has joined the chat'
-            sounds_dir = INTRO_SOUNDS_DIR
+            tts_text = f'{names} have joined the chat'
+            default_sound_path = self.intro_sounds.default_sound_path
+
+        try:
+            LOG.debug( f'Generating group intro: "{tts_text}"' )
+            audio_content = await self.tts.generate_tts( tts_text, language_code='en-US', voice_name='en-US-Neural2-C', deadline=INTRO_TTS_DEADLINE )
+            return CachedOpusAudio( await self.sound_cache.decode( audio_content ) )
+        except Exception as ex:
+            LOG.error( f'Failed to generate group intro for "{tts_text}":', exc_info=ex )
+
+        return await self.sound_cache.get_audio( default_sound_path )
+
+    async def _flush_intro_batch( self, batch: PendingIntroBatch, delay: float ):
+        if delay > 0:
+            await asyncio.sleep( delay )
+
+        if self.pending_intros.get( batch.channel.id ) is batch:
+            del self.pending_intros[ batch.channel.id ]
+
+        members = [ m for m in batch.members if m.voice is not None and m.voice.channel == batch.channel ]
+        if not members:
+            try:
+                await batch.voice_client
+            except Exception:
+                return
+            self.voice_connections.release( batch.channel )
+            return
+
+        LOG.info( f'Introducing {len( members )} member(s) in {batch.channel.name} (ID: {batch.channel.id}): {", ".join( m.name for m in members )}' )
+
+        try:
+            if members == batch.members[ :1 ]:
+                source = CachedOpusAudio( await batch.first_intro )
+            else:
+                source = await self._get_group_intro_audio( members, welcome=batch.welcome )
+            source.on_first_frame = lambda: VOICE_EVENT_TO_AUDIO_LATENCY.observe( time.perf_counter() - batch.started_at, kind='intro' )
+            voice_client = await batch.voice_client
+            await self.playback.play( voice_client, source, PlaybackPriority.INTRO, max_wait=INTRO_MAX_WAIT )
+        except Exception as ex:
+            LOG.error( f'Failed to intro for {", ".join( m.name for m in members )} in {batch.channel.name} (ID: {batch.channel.id})', exc_info=ex )
+
+    def _create_intro_task( self, coro: Coroutine[ Any, Any, None ] ) -> asyncio.Task[ None ]:
+        task = asyncio.create_task( coro )
+        self.intro_tasks.add( task )
+        task.add_done_callback( self.intro_tasks.discard )
+        return task
+
+    def _queue_intro( self, member: discord.Member, channel: VoiceChannel ):
+        batch = self.pending_intros.get( channel.id )
+        if batch is None:
+            welcome = all( m.bot or m == member for m in channel.members )
+            batch = PendingIntroBatch(
+                channel=channel,
+                welcome=welcome,
+                voice_client=asyncio.create_task( self.voice_connections.connect( channel ) ),
+                first_intro=asyncio.create_task( self._get_intro_frames( member, welcome=welcome ) ),
+            )
+            batch.voice_client.add_done_callback( _log_task_failure )
+            batch.first_intro.add_done_callback( _log_task_failure )
+            batch.flusher = self._create_intro_task( self._flush_intro_batch( batch, self.debounce_window ) )
+            self.pending_intros[ channel.id ] = batch
+
+        batch.members.append( member )
 
-        return await self._get_member_sound( text_format, member, sounds_dir, 'default.mp3' )
+        if len( batch.members ) >= self.max_batch_size:
+            assert batch.flusher is not None
+            batch.flusher.cancel()
+            del self.pending_intros[ channel.id ]
+            batch.flusher = self._create_intro_task( self._flush_intro_batch( batch, 0 ) )
 
     @commands.Cog.listener()
     async def on_voice_state_update( self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState ):
@@ -61,28 +289,10 @@ class IntroducerCog( commands.Cog ):
         if not after.channel:
             if before.channel:
                 if all( m.bot for m in before.channel.members ):
-                    voice_client = get_channel_voice_client( self.bot, before.channel )
-                    if voice_client:
-                        LOG.info( f'Empty voice chat detected, disconnecting' )
-                        await voice_client.disconnect()
+                    LOG.info( f'Empty voice chat detected, releasing voice connection' )
+                    self.voice_connections.release( before.channel )
             return
 
         LOG.info( f'{member.name} (ID: {member.id}) joined {after.channel.name} (ID: {after.channel.id})' )
 
-        welcome = all( m.bot or m == member for m in after.channel.members )
-
-        intro_delayer = asyncio.create_task( asyncio.sleep( INTRO_DELAY ) )
-
-        chat_joiner = asyncio.create_task( join_voice_chat( self.bot, after.channel ) )
-        sound_creator = asyncio.create_task( self._get_intro_sound( member, welcome=welcome ) )
-
-        voice_client = await chat_joiner
-        sound_mp3_path = await sound_creator
-
-        await intro_delayer
-
-        try:
-            source = discord.PCMVolumeTransformer( discord.FFmpegPCMAudio( source=str( sound_mp3_path ) ) )
-            await play_voice_channel_audio( voice_client, source )
-        except Exception as ex:
-            LOG.error( f'Failed to intro for {member.name}: {sound_mp3_path}', exc_info=ex )
+        self._queue_intro( member, after.channel )
@@ -1,12 +1,84 @@
+import copy
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 import discord
 
 from constants import LOGS_DIR
 
-def setup_logging():
+LOG_FILE_NAME = 'dabs_clan_discord_bot'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 20
+
+DEBUG_RATE_LIMIT = 50
+DEBUG_RATE_WINDOW = 10.0
+
+class JsonLinesFormatter( logging.Formatter ):
+    def format( self, record: logging.LogRecord ) -> str:
+        entry = {
+            'time': datetime.fromtimestamp( record.created, tz=timezone.utc ).isoformat( timespec='milliseconds' ),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry[ 'exception' ] = self.formatException( record.exc_info )
+        return json.dumps( entry, ensure_ascii=False )
+
+class ExceptionQueueHandler( logging.handlers.QueueHandler ):
+    def prepare( self, record: logging.LogRecord ) -> logging.LogRecord:
+        # The queue never leaves this process, so keep exc_info for the listener's formatters instead of folding the traceback into msg
+        record = copy.copy( record )
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+class DebugRateLimitFilter( logging.Filter ):
+    def __init__( self, max_records: int = DEBUG_RATE_LIMIT, window: float = DEBUG_RATE_WINDOW ) -> None:
+        super().__init__()
+        self.max_records = max_records
+        self.window = window
+
+        self.windows: dict[ str, tuple[ float, int, int ] ] = {}
+
+    def filter( self, record: logging.LogRecord ) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        now = time.monotonic()
+        window_start, count, suppressed = self.windows.get( record.name, ( now, 0, 0 ) )
+        if now - window_start >= self.window:
+            if suppressed:
+                record.msg = f'{record.getMessage()} ({suppressed} debug message(s) from this logger suppressed)'
+                record.args = None
+            window_start, count, suppressed = now, 0, 0
+
+        if count >= self.max_records:
+            self.windows[ record.name ] = ( window_start, count, suppressed + 1 )
+            return False
+
+        self.windows[ record.name ] = ( window_start, count + 1, suppressed )
+        return True
+
+def _gzip_rotator( source: str, dest: str ):
+    with open( source, 'rb' ) as f_in, gzip.open( dest, 'wb' ) as f_out:
+        shutil.copyfileobj( f_in, f_out )
+    os.remove( source )
+
+def _gzip_namer( name: str ) -> str:
+    return f'{name}.gz'
+
+def setup_logging( json_lines: bool = False, debug_rate_limit: int | None = DEBUG_RATE_LIMIT, file_name: str = LOG_FILE_NAME ) -> logging.handlers.QueueListener:
     stream_handler = logging.StreamHandler()
 
     discord.utils.setup_logging( root=True, handler=stream_handler, level=logging.DEBUG )
@@ -14,14 +86,39 @@ def setup_logging():
     stream_handler.setLevel( logging.INFO )
 
     logger = logging.getLogger()
+    logger.removeHandler( stream_handler )
 
-    formatter = logging.Formatter( '[{asctime}] [{levelname:<8}] {name}: {message}', datefmt='%Y-%m-%d %H:%M:%S', style='{' )
+    if json_lines:
+        formatter: logging.Formatter = JsonLinesFormatter()
+        log_path = LOGS_DIR / f'{file_name}.jsonl'
+    else:
+        formatter = logging.Formatter( '[{asctime}] [{levelname:<8}] {name}: {message}', datefmt='%Y-%m-%d %H:%M:%S', style='{' )
+        log_path = LOGS_DIR / f'{file_name}.log'
 
     LOGS_DIR.mkdir( parents=True, exist_ok=True )
-    file_handler = logging.FileHandler(
-        filename=LOGS_DIR / 'dabs_clan_discord_bot.{:%Y-%m-%d_%H.%M.%S}.log'.format( datetime.now() ),
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename=log_path,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
         encoding='utf-8',
+        delay=True,
     )
+    file_handler.rotator = _gzip_rotator
+    file_handler.namer = _gzip_namer
     file_handler.setLevel( logging.DEBUG )
     file_handler.setFormatter( formatter )
-    logger.addHandler( file_handler )
\ No newline at end of file
+
+    if log_path.exists() and log_path.stat().st_size > 0:
+        file_handler.doRollover()
+
+    log_queue: queue.SimpleQueue[ logging.LogRecord ] = queue.SimpleQueue()
+    queue_handler = ExceptionQueueHandler( log_queue )
+    queue_handler.setLevel( logging.DEBUG )
+    if debug_rate_limit is not None:
+        queue_handler.addFilter( DebugRateLimitFilter( max_records=debug_rate_limit ) )
+    logger.addHandler( queue_handler )
+
+    listener = logging.handlers.QueueListener( log_queue, stream_handler, file_handler, respect_handler_level=True )
+    listener.start()
+
+    return listener
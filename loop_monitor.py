@@ -0,0 +1,163 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from dataclasses import dataclass
+
+from discord.ext import commands
+
+from metrics import LOOP_LAG, LOOP_STALLS
+
+LOG = logging.getLogger( __name__ )
+
+DEFAULT_TICK_INTERVAL = 0.25
+DEFAULT_STALL_THRESHOLD = 0.1
+DEFAULT_SAMPLE_INTERVAL = 0.05
+DEFAULT_MAX_STACK_DEPTH = 8
+DEFAULT_MAX_OFFENDERS = 256
+
+UNSAMPLED_STACK = ( '<stall ended before it could be sampled>', )
+
+MAX_REPORT_LENGTH = 1900
+
+StackSignature = tuple[ str, ... ]
+
+@dataclass
+class StallOffender:
+    stack: StackSignature
+    count: int = 0
+    total_lag: float = 0.0
+    max_lag: float = 0.0
+
+class LoopMonitor:
+    def __init__(
+        self,
+        tick_interval: float = DEFAULT_TICK_INTERVAL,
+        stall_threshold: float = DEFAULT_STALL_THRESHOLD,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        max_stack_depth: int = DEFAULT_MAX_STACK_DEPTH,
+        max_offenders: int = DEFAULT_MAX_OFFENDERS,
+    ) -> None:
+        self.tick_interval = tick_interval
+        self.stall_threshold = stall_threshold
+        self.sample_interval = sample_interval
+        self.max_stack_depth = max_stack_depth
+        self.max_offenders = max_offenders
+
+        self.lock = threading.Lock()
+        self.last_tick = time.monotonic()
+        self.stall_samples: list[ StackSignature ] = []
+
+        self.offenders: dict[ StackSignature, StallOffender ] = {}
+        self.stalls = 0
+        self.max_lag = 0.0
+
+        self.loop_thread_id: int | None = None
+        self.ticker: asyncio.Task[ None ] | None = None
+        self.watchdog: threading.Thread | None = None
+        self.stopping = threading.Event()
+
+    def start( self ):
+        if self.ticker is not None:
+            return
+
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.stopping.clear()
+
+        self.ticker = asyncio.create_task( self._tick(), name='loop-monitor' )
+        self.watchdog = threading.Thread( target=self._watch, name='loop-watchdog', daemon=True )
+        self.watchdog.start()
+
+    def stop( self ):
+        self.stopping.set()
+        if self.ticker is not None:
+            self.ticker.cancel()
+            self.ticker = None
+        if self.watchdog is not None:
+            self.watchdog.join( timeout=1 )
+            self.watchdog = None
+
+    async def _tick( self ):
+        while True:
+            expected = time.monotonic() + self.tick_interval
+            await asyncio.sleep( self.tick_interval )
+            now = time.monotonic()
+
+            lag = max( 0.0, now - expected )
+            LOOP_LAG.observe( lag )
+
+            with self.lock:
+                self.last_tick = now
+                samples = self.stall_samples
+                self.stall_samples = []
+
+            if lag >= self.stall_threshold:
+                self._record_stall( lag, samples )
+
+    def _sample_stack( self ) -> StackSignature | None:
+        assert self.loop_thread_id is not None
+        frame = sys._current_frames().get( self.loop_thread_id )
+        if frame is None:
+            return None
+        return tuple( f'{f.filename}:{f.lineno} in {f.name}' for f in traceback.extract_stack( frame, limit=self.max_stack_depth ) )
+
+    def _watch( self ):
+        while not self.stopping.wait( self.sample_interval ):
+            with self.lock:
+                overdue = time.monotonic() - self.last_tick - self.tick_interval
+            if overdue < self.sample_interval:
+                continue
+
+            stack = self._sample_stack()
+            if stack is None:
+                continue
+
+            with self.lock:
+                self.stall_samples.append( stack )
+
+    def _record_stall( self, lag: float, samples: list[ StackSignature ] ):
+        stack = collections.Counter( samples ).most_common( 1 )[ 0 ][ 0 ] if samples else UNSAMPLED_STACK
+
+        self.stalls += 1
+        self.max_lag = max( self.max_lag, lag )
+        LOOP_STALLS.inc()
+
+        offender = self.offenders.get( stack )
+        if offender is None:
+            if len( self.offenders ) >= self.max_offenders:
+                del self.offenders[ min( self.offenders, key=lambda s: self.offenders[ s ].total_lag ) ]
+            offender = self.offenders[ stack ] = StallOffender( stack )
+        offender.count += 1
+        offender.total_lag += lag
+        offender.max_lag = max( offender.max_lag, lag )
+
+        LOG.warning( f'Event loop stalled for {lag * 1000:.0f}ms at {stack[ -1 ]}' )
+
+    def worst_offenders( self, limit: int = 5 ) -> list[ StallOffender ]:
+        return sorted( self.offenders.values(), key=lambda o: o.total_lag, reverse=True )[ :limit ]
+
+    def report( self, limit: int = 5 ) -> str:
+        lines = [ f'{self.stalls} stall(s) over {self.stall_threshold * 1000:.0f}ms, worst {self.max_lag * 1000:.0f}ms' ]
+        for offender in self.worst_offenders( limit ):
+            lines.append( '' )
+            lines.append( f'{offender.count}x, total {offender.total_lag * 1000:.0f}ms, max {offender.max_lag * 1000:.0f}ms:' )
+            lines.extend( f'  {frame}' for frame in offender.stack )
+        return '\n'.join( lines )
+
+class LoopMonitorCog( commands.Cog ):
+    def __init__( self, bot: commands.Bot, loop_monitor: LoopMonitor ) -> None:
+        self.bot = bot
+        self.loop_monitor = loop_monitor
+
+    @commands.command( name='stalls' )
+    @commands.is_owner()
+    async def stalls( self, ctx: commands.Context[ commands.Bot ], limit: int = 3 ):
+        report = self.loop_monitor.report( limit )
+        if len( report ) > MAX_REPORT_LENGTH:
+            report = report[ :MAX_REPORT_LENGTH ] + '\n...'
+        await ctx.send( f'```\n{report}\n```' )
@@ -1,45 +1,219 @@
+import argparse
 import asyncio
 import logging
+import sys
+
+from pathlib import Path
 
 import discord
 
 from discord.ext import commands
 
+from channel_registry import ChannelRegistry, ChannelRegistryCog
+from constants import CHANNEL_REGISTRY_DB_PATH, INTRO_SOUNDS_DIR, SHARD_SOCKET_PATH, TTS_CACHE_DIR, WELCOME_SOUNDS_DIR
 from diablo_elixir_alerter import DiabloElixirAlerter
+from diablo_events import EventsClient
 from diablo_events_alerter import DiabloEventsAlerter
+from generate_sounds import CUSTOM_INTROS
+from intro_sounds import IntroSoundStore
 from introducer import IntroducerCog
-from logs import setup_logging
+from logs import LOG_FILE_NAME, setup_logging
+from loop_monitor import LoopMonitor, LoopMonitorCog
+from metrics import DEFAULT_METRICS_PORT, MetricsServer
+from playback import PlaybackManager
 from secret import TOKEN
-from tts import TTS
+from shards import ShardClient, ShardCoordinator, ShardTTS, worker_shard_ids
+from sound_cache import SoundCache
+from trace_recorder import TraceRecorder, TraceRecorderCog
+from tts import EspeakTTSBackend, TTS
+from tts_cache import TTSCache
+from voice_connections import VoiceConnectionManager
 
 LOG = logging.getLogger( __name__ )
 
-intents = discord.Intents.default()
-intents.message_content = True
-intents.voice_states = True
+WORKER_RESTART_DELAY = 5.0
+WORKER_STOP_TIMEOUT = 10.0
+
+def create_bot( shard_ids: list[ int ] | None = None, shard_count: int | None = None, members_intent: bool = False ) -> commands.Bot:
+    intents = discord.Intents.default()
+    intents.members = members_intent
+    intents.message_content = True
+    intents.voice_states = True
+
+    if shard_count is not None:
+        bot: commands.Bot = commands.AutoShardedBot(
+            command_prefix='!',
+            intents=intents,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+        )
+    else:
+        bot = commands.Bot(
+            command_prefix='!',
+            intents=intents,
+        )
+
+    @bot.event
+    async def on_ready():
+        LOG.info( f'READY: Logged in as {bot.user} (ID: {bot.user.id if bot.user else ""})' )
+
+    return bot
+
+def create_tts() -> TTS:
+    fallback_tts = EspeakTTSBackend() if EspeakTTSBackend.is_available() else None
+    if fallback_tts is None:
+        LOG.warning( 'espeak-ng not found, TTS requests will not fall back to a local engine' )
+
+    return TTS( cache=TTSCache( TTS_CACHE_DIR ), fallback=fallback_tts )
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--log-json', action='store_true', help='write the log file as JSON lines' )
+    parser.add_argument( '--record-trace', type=Path, help='record voice state updates and events feed responses to a gzipped JSON-lines trace' )
+    parser.add_argument( '--members-intent', action='store_true', help='request the privileged server members intent (enable it in the Discord developer portal first) so intro sounds are pre-warmed for every member, not just cached ones' )
+    parser.add_argument( '--metrics-port', type=int, default=DEFAULT_METRICS_PORT, help='port for the metrics endpoint; shard worker N uses this port + N + 1' )
+    parser.add_argument( '--workers', type=int, default=1, help='run a coordinator that polls events and synthesizes TTS for this many shard worker processes' )
+    parser.add_argument( '--shard-count', type=int, help='total number of gateway shards, defaults to one per worker when --workers is given' )
+    parser.add_argument( '--shard-socket', type=Path, default=SHARD_SOCKET_PATH, help='Unix socket the coordinator and shard workers talk over' )
+    parser.add_argument( '--worker', type=int, metavar='INDEX', help=argparse.SUPPRESS )
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error( '--workers must be at least 1' )
+    if args.workers > 1 and args.shard_count is None:
+        args.shard_count = args.workers
+    if args.shard_count is not None and args.shard_count < args.workers:
+        parser.error( '--shard-count must be at least --workers' )
+    if args.workers > 1 and args.record_trace is not None:
+        parser.error( '--record-trace is only supported in a single process' )
+
+    return args
+
+async def run_bot( args: argparse.Namespace, shard_client: ShardClient | None = None, shard_ids: list[ int ] | None = None, metrics_port: int = DEFAULT_METRICS_PORT ):
+    bot = create_bot( shard_ids, args.shard_count, args.members_intent )
+
+    tts = ShardTTS( shard_client ) if shard_client is not None else create_tts()
+    sound_cache = SoundCache()
+
+    curated_sound_paths = [ c.path for c in CUSTOM_INTROS ]
+    intro_sounds = IntroSoundStore( tts, INTRO_SOUNDS_DIR, curated_sound_paths )
+    welcome_sounds = IntroSoundStore( tts, WELCOME_SOUNDS_DIR, curated_sound_paths )
+
+    registry = ChannelRegistry( CHANNEL_REGISTRY_DB_PATH )
+    registry.load()
+
+    voice_connections = VoiceConnectionManager( bot )
+    playback = PlaybackManager()
 
-bot = commands.Bot(
-    command_prefix='!',
-    intents=intents,
-)
+    trace_recorder = TraceRecorder( args.record_trace ) if args.record_trace else None
+    events_client: EventsClient | None = None
+    if shard_client is None:
+        events_client = EventsClient(
+            on_body=trace_recorder.record_events_body if trace_recorder else None,
+            on_poll=trace_recorder.record_events_poll if trace_recorder else None,
+        )
 
-@bot.event
-async def on_ready():
-    LOG.info( f'READY: Logged in as {bot.user} (ID: {bot.user.id if bot.user else ""})' )
+    loop_monitor = LoopMonitor()
+    loop_monitor.start()
 
-async def main():
-    setup_logging()
+    metrics_server = MetricsServer( port=metrics_port )
+    await metrics_server.start()
 
-    tts = TTS()
+    try:
+        async with bot:
+            if trace_recorder is not None:
+                await bot.add_cog( TraceRecorderCog( bot, registry, trace_recorder ) )
+            await bot.add_cog( ChannelRegistryCog( bot, registry ) )
+            await bot.add_cog( IntroducerCog( bot, registry, tts, sound_cache, intro_sounds, welcome_sounds, voice_connections, playback ) )
+            await bot.add_cog( DiabloElixirAlerter( bot, registry, sound_cache, voice_connections, playback ) )
+
+            events_alerter = DiabloEventsAlerter( bot, registry, tts, sound_cache, voice_connections, playback, events_client, poll_events=shard_client is None )
+            await bot.add_cog( events_alerter )
+            if shard_client is not None:
+                shard_client.on_events = events_alerter.set_events
+                shard_client.start()
+
+            await bot.add_cog( LoopMonitorCog( bot, loop_monitor ) )
+            await bot.start( TOKEN )
+    finally:
+        await metrics_server.stop()
+        loop_monitor.stop()
+        if trace_recorder is not None:
+            trace_recorder.close()
+        if shard_client is not None:
+            await shard_client.close()
+
+async def run_worker( args: argparse.Namespace ):
+    shard_ids = worker_shard_ids( args.worker, args.workers, args.shard_count )
+    LOG.info( f'Starting shard worker {args.worker}: shards={shard_ids}, shard_count={args.shard_count}' )
+
+    await run_bot( args, ShardClient( args.shard_socket ), shard_ids, args.metrics_port + args.worker + 1 )
+
+async def supervise_worker( args: argparse.Namespace, index: int ):
+    worker_args = [
+        sys.executable, __file__,
+        '--worker', str( index ),
+        '--workers', str( args.workers ),
+        '--shard-count', str( args.shard_count ),
+        '--shard-socket', str( args.shard_socket ),
+        '--metrics-port', str( args.metrics_port ),
+    ]
+    if args.log_json:
+        worker_args.append( '--log-json' )
+    if args.members_intent:
+        worker_args.append( '--members-intent' )
+
+    while True:
+        process = await asyncio.create_subprocess_exec( *worker_args )
+        LOG.info( f'Started shard worker {index} (PID: {process.pid})' )
+
+        try:
+            return_code = await process.wait()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for( process.wait(), timeout=WORKER_STOP_TIMEOUT )
+                except asyncio.TimeoutError:
+                    LOG.warning( f'Shard worker {index} did not stop, killing it (PID: {process.pid})' )
+                    process.kill()
+            raise
+
+        LOG.error( f'Shard worker {index} exited with code {return_code}, restarting in {WORKER_RESTART_DELAY}s' )
+        await asyncio.sleep( WORKER_RESTART_DELAY )
+
+async def run_coordinator( args: argparse.Namespace ):
+    coordinator = ShardCoordinator( args.shard_socket, create_tts(), EventsClient() )
+    await coordinator.start()
+
+    loop_monitor = LoopMonitor()
+    loop_monitor.start()
+
+    metrics_server = MetricsServer( port=args.metrics_port )
+    await metrics_server.start()
+
+    try:
+        await asyncio.gather( *( supervise_worker( args, i ) for i in range( args.workers ) ) )
+    finally:
+        await metrics_server.stop()
+        loop_monitor.stop()
+        await coordinator.stop()
 
-    async with bot:
-        await bot.add_cog( IntroducerCog( bot, tts ) )
-        await bot.add_cog( DiabloElixirAlerter( bot ) )
-        await bot.add_cog( DiabloEventsAlerter( bot, tts ) )
-        await bot.start( TOKEN )
+async def main( args: argparse.Namespace ):
+    if args.worker is not None:
+        await run_worker( args )
+    elif args.workers > 1:
+        await run_coordinator( args )
+    else:
+        await run_bot( args, metrics_port=args.metrics_port )
 
 if __name__ == '__main__':
+    args = parse_args()
+    log_file_name = f'{LOG_FILE_NAME}-worker{args.worker}' if args.worker is not None else LOG_FILE_NAME
+    log_listener = setup_logging( json_lines=args.log_json, file_name=log_file_name )
     try:
-        asyncio.run( main() )
+        asyncio.run( main( args ) )
     except KeyboardInterrupt:
-        pass
\ No newline at end of file
+        pass
+    finally:
+        log_listener.stop()
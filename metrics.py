@@ -0,0 +1,181 @@
+import bisect
+import logging
+import math
+import threading
+
+from abc import ABC, abstractmethod
+
+from aiohttp import web
+
+LOG = logging.getLogger( __name__ )
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+DEFAULT_METRICS_PORT = 9464
+
+DEFAULT_LATENCY_BUCKETS = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0 )
+LATENESS_BUCKETS = ( -1.0, -0.1, 0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0 )
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = tuple[ str, ... ]
+
+def _format_value( value: float ) -> str:
+    if math.isinf( value ):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr( float( value ) )
+
+def _escape_label_value( value: str ) -> str:
+    return value.replace( '\\', '\\\\' ).replace( '\n', '\\n' ).replace( '"', '\\"' )
+
+def _format_labels( names: tuple[ str, ... ], values: LabelValues, extra: tuple[ tuple[ str, str ], ... ] = () ) -> str:
+    pairs = [ *zip( names, values ), *extra ]
+    if not pairs:
+        return ''
+    return '{' + ','.join( f'{name}="{_escape_label_value( value )}"' for name, value in pairs ) + '}'
+
+class _Metric( ABC ):
+    type_name: str
+
+    def __init__( self, name: str, documentation: str, label_names: tuple[ str, ... ] = () ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.lock = threading.Lock()
+
+    def _label_values( self, labels: dict[ str, str ] ) -> LabelValues:
+        if set( labels ) != set( self.label_names ):
+            raise ValueError( f'Metric {self.name} expects labels {self.label_names}, got {tuple( labels )}' )
+        return tuple( str( labels[ name ] ) for name in self.label_names )
+
+    @abstractmethod
+    def _samples( self ) -> list[ str ]:
+        ...
+
+    def expose( self ) -> str:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+            *self._samples(),
+        ]
+        return '\n'.join( lines )
+
+class Counter( _Metric ):
+    type_name = 'counter'
+
+    def __init__( self, name: str, documentation: str, label_names: tuple[ str, ... ] = () ) -> None:
+        super().__init__( name, documentation, label_names )
+        self.values: dict[ LabelValues, float ] = {}
+
+    def inc( self, amount: float = 1.0, **labels: str ):
+        key = self._label_values( labels )
+        with self.lock:
+            self.values[ key ] = self.values.get( key, 0.0 ) + amount
+
+    def get( self, **labels: str ) -> float:
+        return self.values.get( self._label_values( labels ), 0.0 )
+
+    def _samples( self ) -> list[ str ]:
+        with self.lock:
+            values = sorted( self.values.items() )
+        return [ f'{self.name}{_format_labels( self.label_names, key )} {_format_value( value )}' for key, value in values ]
+
+class Histogram( _Metric ):
+    type_name = 'histogram'
+
+    def __init__( self, name: str, documentation: str, label_names: tuple[ str, ... ] = (), buckets: tuple[ float, ... ] = DEFAULT_LATENCY_BUCKETS ) -> None:
+        super().__init__( name, documentation, label_names )
+        self.buckets = tuple( sorted( buckets ) )
+        self.counts: dict[ LabelValues, list[ int ] ] = {}
+        self.sums: dict[ LabelValues, float ] = {}
+
+    def observe( self, value: float, **labels: str ):
+        key = self._label_values( labels )
+        index = bisect.bisect_left( self.buckets, value )
+        with self.lock:
+            counts = self.counts.get( key )
+            if counts is None:
+                counts = self.counts[ key ] = [ 0 ] * ( len( self.buckets ) + 1 )
+            counts[ index ] += 1
+            self.sums[ key ] = self.sums.get( key, 0.0 ) + value
+
+    def _samples( self ) -> list[ str ]:
+        with self.lock:
+            series = sorted( ( key, list( counts ), self.sums[ key ] ) for key, counts in self.counts.items() )
+
+        lines: list[ str ] = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip( ( *self.buckets, math.inf ), counts ):
+                cumulative += count
+                lines.append( f'{self.name}_bucket{_format_labels( self.label_names, key, ( ( "le", _format_value( bound ) ), ) )} {cumulative}' )
+            lines.append( f'{self.name}_sum{_format_labels( self.label_names, key )} {_format_value( total )}' )
+            lines.append( f'{self.name}_count{_format_labels( self.label_names, key )} {cumulative}' )
+        return lines
+
+class MetricsRegistry:
+    def __init__( self ) -> None:
+        self.metrics: dict[ str, _Metric ] = {}
+
+    def _register( self, metric: _Metric ):
+        if metric.name in self.metrics:
+            raise ValueError( f'Metric already registered: {metric.name}' )
+        self.metrics[ metric.name ] = metric
+
+    def counter( self, name: str, documentation: str, label_names: tuple[ str, ... ] = () ) -> Counter:
+        counter = Counter( name, documentation, label_names )
+        self._register( counter )
+        return counter
+
+    def histogram( self, name: str, documentation: str, label_names: tuple[ str, ... ] = (), buckets: tuple[ float, ... ] = DEFAULT_LATENCY_BUCKETS ) -> Histogram:
+        histogram = Histogram( name, documentation, label_names, buckets )
+        self._register( histogram )
+        return histogram
+
+    def expose( self ) -> str:
+        return '\n'.join( m.expose() for m in self.metrics.values() ) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+TTS_LATENCY = REGISTRY.histogram( 'dabs_tts_generate_seconds', 'Time to produce TTS audio, including cache lookups and fallbacks.' )
+TTS_BACKEND_LATENCY = REGISTRY.histogram( 'dabs_tts_backend_seconds', 'Time spent in a TTS backend synthesizing audio.', ( 'backend', ) )
+VOICE_HANDSHAKE_LATENCY = REGISTRY.histogram( 'dabs_voice_handshake_seconds', 'Time to connect or move a voice connection.' )
+VOICE_EVENT_TO_AUDIO_LATENCY = REGISTRY.histogram( 'dabs_voice_event_to_audio_seconds', 'Time from a voice state event to the first audio frame being played.', ( 'kind', ) )
+ALERT_LATENESS = REGISTRY.histogram( 'dabs_alert_lateness_seconds', 'Time between an alert\'s scheduled time and when it started.', ( 'alert', ), buckets=LATENESS_BUCKETS )
+EVENTS_POLL_LATENCY = REGISTRY.histogram( 'dabs_events_poll_seconds', 'Latency of d4armory events polls.', ( 'result', ) )
+FFMPEG_SPAWNS = REGISTRY.counter( 'dabs_ffmpeg_spawns_total', 'Number of FFmpeg processes spawned to decode audio.', ( 'source', ) )
+LOOP_LAG = REGISTRY.histogram( 'dabs_event_loop_lag_seconds', 'How late the event loop monitor\'s periodic tick ran.', buckets=LATENESS_BUCKETS[ 2: ] )
+LOOP_STALLS = REGISTRY.counter( 'dabs_event_loop_stalls_total', 'Number of event loop stalls over the monitor threshold.' )
+
+class MetricsServer:
+    def __init__( self, registry: MetricsRegistry = REGISTRY, host: str = DEFAULT_METRICS_HOST, port: int = DEFAULT_METRICS_PORT ) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+
+        self.runner: web.AppRunner | None = None
+
+    async def _handle_metrics( self, request: web.Request ) -> web.Response:
+        return web.Response( body=self.registry.expose().encode( 'utf-8' ), headers={ 'Content-Type': CONTENT_TYPE } )
+
+    async def start( self ):
+        app = web.Application()
+        app.router.add_get( '/metrics', self._handle_metrics )
+
+        self.runner = web.AppRunner( app, access_log=None )
+        await self.runner.setup()
+
+        site = web.TCPSite( self.runner, self.host, self.port )
+        try:
+            await site.start()
+        except OSError as ex:
+            LOG.warning( f'Failed to serve metrics on {self.host}:{self.port}, continuing without metrics: {ex}' )
+            await self.runner.cleanup()
+            self.runner = None
+            return
+
+        LOG.info( f'Serving metrics on http://{self.host}:{self.port}/metrics' )
+
+    async def stop( self ):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from collections import OrderedDict
+from typing import Iterable, Sequence
+
+from sound_cache import SoundCache
+from tts import TTS
+
+LOG = logging.getLogger( __name__ )
+
+OPUS_FRAME_DURATION = 0.02
+OPUS_SILENCE_FRAME = b'\xf8\xff\xfe'
+
+DEFAULT_MAX_SEGMENTS = 1024
+DEFAULT_PREWARM_CONCURRENCY = 2
+
+def silence_frames( seconds: float ) -> tuple[ bytes, ... ]:
+    return ( OPUS_SILENCE_FRAME, ) * round( seconds / OPUS_FRAME_DURATION )
+
+class PhraseSegmentLibrary:
+    def __init__(
+        self,
+        tts: TTS,
+        sound_cache: SoundCache,
+        language_code: str = 'en-US',
+        voice_name: str = 'en-US-Neural2-C',
+        timeout: float | None = None,
+        max_segments: int = DEFAULT_MAX_SEGMENTS,
+    ) -> None:
+        self.tts = tts
+        self.sound_cache = sound_cache
+        self.language_code = language_code
+        self.voice_name = voice_name
+        self.timeout = timeout
+        self.max_segments = max_segments
+
+        self.segments: OrderedDict[ str, tuple[ bytes, ... ] ] = OrderedDict()
+        self.pending: dict[ str, asyncio.Future[ tuple[ bytes, ... ] ] ] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__( self, text: str ) -> bool:
+        return text in self.segments
+
+    async def _render_segment( self, text: str ) -> tuple[ bytes, ... ]:
+        audio_content = await self.tts.generate_tts( text, language_code=self.language_code, voice_name=self.voice_name, fallback=False )
+        frames = await self.sound_cache.decode( audio_content )
+
+        self.segments[ text ] = frames
+        while len( self.segments ) > self.max_segments:
+            self.segments.popitem( last=False )
+
+        return frames
+
+    def _render_done( self, text: str, future: asyncio.Future[ tuple[ bytes, ... ] ] ):
+        if self.pending.get( text ) is future:
+            del self.pending[ text ]
+        if not future.cancelled() and future.exception() is not None:
+            LOG.debug( f'Failed to render phrase segment "{text}": {future.exception()!r}' )
+
+    async def get_segment( self, text: str, timeout: float | None = None ) -> tuple[ bytes, ... ]:
+        frames = self.segments.get( text )
+        if frames is not None:
+            self.hits += 1
+            self.segments.move_to_end( text )
+            return frames
+
+        future = self.pending.get( text )
+        if future is None:
+            self.misses += 1
+            LOG.debug( f'Rendering new phrase segment: "{text}"' )
+
+            future = self.pending[ text ] = asyncio.ensure_future( self._render_segment( text ) )
+            future.add_done_callback( lambda f: self._render_done( text, f ) )
+
+        return await asyncio.wait_for( asyncio.shield( future ), timeout )
+
+    async def assemble( self, phrases: Sequence[ Sequence[ str ] ], pause: float ) -> tuple[ bytes, ... ]:
+        texts = list( dict.fromkeys( t for parts in phrases for t in parts ) )
+        rendered = dict( zip( texts, await asyncio.gather( *( self.get_segment( t, self.timeout ) for t in texts ) ) ) )
+
+        gap = silence_frames( pause )
+
+        frames: list[ bytes ] = []
+        for i, parts in enumerate( phrases ):
+            if i > 0:
+                frames.extend( gap )
+            for text in parts:
+                frames.extend( rendered[ text ] )
+        return tuple( frames )
+
+    async def prewarm( self, texts: Iterable[ str ], concurrency: int = DEFAULT_PREWARM_CONCURRENCY ) -> int:
+        missing = [ t for t in dict.fromkeys( texts ) if t not in self.segments ]
+        if not missing:
+            return 0
+
+        semaphore = asyncio.Semaphore( concurrency )
+
+        async def prewarm_segment( text: str ) -> bool:
+            async with semaphore:
+                try:
+                    await self.get_segment( text )
+                    return True
+                except Exception as ex:
+                    LOG.warning( f'Failed to pre-render phrase segment: "{text}"', exc_info=ex )
+                    return False
+
+        rendered = sum( await asyncio.gather( *( prewarm_segment( t ) for t in missing ) ) )
+        LOG.info( f'Pre-rendered {rendered}/{len( missing )} phrase segment(s), {len( self.segments )} cached' )
+        return rendered
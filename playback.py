@@ -0,0 +1,148 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+
+from collections import deque
+from dataclasses import dataclass, field
+
+import discord
+
+LOG = logging.getLogger( __name__ )
+
+WAIT_TIME_HISTORY = 100
+
+class PlaybackPriority( enum.IntEnum ):
+    EVENT_ALERT = 0
+    INTRO = 1
+    ELIXIR_ALERT = 2
+
+@dataclass( order=True )
+class _PlaybackItem:
+    priority: PlaybackPriority
+    seq: int
+    voice_client: discord.VoiceClient = field( compare=False )
+    source: discord.AudioSource = field( compare=False )
+    enqueued_at: float = field( compare=False )
+    expires_at: float | None = field( compare=False )
+    future: asyncio.Future[ bool ] = field( compare=False )
+    preempted: bool = field( default=False, compare=False )
+
+class GuildPlaybackQueue:
+    def __init__( self, manager: 'PlaybackManager', guild_id: int ) -> None:
+        self.manager = manager
+        self.guild_id = guild_id
+
+        self.heap: list[ _PlaybackItem ] = []
+        self.current: _PlaybackItem | None = None
+        self.worker: asyncio.Task[ None ] | None = None
+
+    @property
+    def depth( self ) -> int:
+        return len( self.heap )
+
+    def put( self, item: _PlaybackItem, preempt: bool ):
+        heapq.heappush( self.heap, item )
+
+        current = self.current
+        if preempt and current is not None and current.priority > item.priority:
+            LOG.info( f'Preempting {current.priority.name} playback in guild {self.guild_id} for {item.priority.name}' )
+            self.manager.preempted += 1
+            current.preempted = True
+            current.voice_client.stop()
+
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task( self._run(), name=f'playback-{self.guild_id}' )
+
+    def _discard( self, item: _PlaybackItem ):
+        item.source.cleanup()
+        if not item.future.done():
+            item.future.set_result( False )
+
+    async def _play( self, item: _PlaybackItem ):
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def after_play( ex: Exception | None ):
+            def finish():
+                if finished.done():
+                    return
+                if ex:
+                    finished.set_exception( ex )
+                else:
+                    finished.set_result( None )
+
+            loop.call_soon_threadsafe( finish )
+
+        self.manager.wait_times.append( loop.time() - item.enqueued_at )
+
+        self.current = item
+        try:
+            item.voice_client.play( item.source, after=after_play )
+            await finished
+        finally:
+            self.current = None
+
+    async def _run( self ):
+        loop = asyncio.get_running_loop()
+
+        while self.heap:
+            item = heapq.heappop( self.heap )
+
+            if item.future.done():
+                item.source.cleanup()
+                continue
+
+            if item.expires_at is not None and loop.time() > item.expires_at:
+                LOG.info( f'Discarding stale {item.priority.name} playback in guild {self.guild_id}' )
+                self.manager.discarded += 1
+                self._discard( item )
+                continue
+
+            try:
+                await self._play( item )
+            except Exception as ex:
+                if not item.future.done():
+                    item.future.set_exception( ex )
+                continue
+
+            if not item.future.done():
+                item.future.set_result( not item.preempted )
+
+class PlaybackManager:
+    def __init__( self ) -> None:
+        self.queues: dict[ int, GuildPlaybackQueue ] = {}
+        self.seq = itertools.count()
+
+        self.wait_times: deque[ float ] = deque( maxlen=WAIT_TIME_HISTORY )
+        self.discarded = 0
+        self.preempted = 0
+
+    def queue_depth( self, guild_id: int | None = None ) -> int:
+        if guild_id is not None:
+            queue = self.queues.get( guild_id )
+            return queue.depth if queue else 0
+        return sum( q.depth for q in self.queues.values() )
+
+    async def play( self, voice_client: discord.VoiceClient, source: discord.AudioSource, priority: PlaybackPriority, max_wait: float | None = None, preempt: bool = False ) -> bool:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        guild_id = voice_client.guild.id
+        queue = self.queues.get( guild_id )
+        if queue is None:
+            queue = self.queues[ guild_id ] = GuildPlaybackQueue( self, guild_id )
+
+        item = _PlaybackItem(
+            priority=priority,
+            seq=next( self.seq ),
+            voice_client=voice_client,
+            source=source,
+            enqueued_at=now,
+            expires_at=now + max_wait if max_wait is not None else None,
+            future=loop.create_future(),
+        )
+        queue.put( item, preempt )
+
+        return await item.future
@@ -0,0 +1,53 @@
+import random
+
+from datetime import datetime, timedelta
+from typing import Iterable
+
+MIN_POLL_INTERVAL = timedelta( minutes=1 )
+MAX_POLL_INTERVAL = timedelta( minutes=20 )
+TRANSITION_WINDOW = timedelta( minutes=5 )
+
+BACKOFF_BASE_INTERVAL = timedelta( seconds=30 )
+MAX_BACKOFF_INTERVAL = timedelta( minutes=15 )
+MAX_BACKOFF_EXPONENT = 16
+
+class AdaptivePollInterval:
+    def __init__(
+        self,
+        min_interval: timedelta = MIN_POLL_INTERVAL,
+        max_interval: timedelta = MAX_POLL_INTERVAL,
+        transition_window: timedelta = TRANSITION_WINDOW,
+        backoff_base_interval: timedelta = BACKOFF_BASE_INTERVAL,
+        max_backoff_interval: timedelta = MAX_BACKOFF_INTERVAL,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.transition_window = transition_window
+        self.backoff_base_interval = backoff_base_interval
+        self.max_backoff_interval = max_backoff_interval
+        self.rng = rng or random.Random()
+
+        self.current_interval = min_interval
+        self.failure_streak = 0
+
+    def record_success( self, now: datetime, transition_times: Iterable[ datetime ] ) -> timedelta:
+        self.failure_streak = 0
+
+        interval = self.max_interval
+        for transition_time in transition_times:
+            if abs( transition_time - now ) <= self.transition_window:
+                interval = self.min_interval
+                break
+            if transition_time > now:
+                interval = min( interval, transition_time - self.transition_window - now )
+
+        self.current_interval = max( self.min_interval, interval )
+        return self.current_interval
+
+    def record_failure( self ) -> timedelta:
+        self.failure_streak += 1
+
+        backoff = min( self.max_backoff_interval, self.backoff_base_interval * ( 2 ** min( self.failure_streak - 1, MAX_BACKOFF_EXPONENT ) ) )
+        self.current_interval = max( self.min_interval, self.rng.uniform( 0.5, 1.0 ) * backoff )
+        return self.current_interval
@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from collections import deque
+from pathlib import Path
+from typing import Any, cast
+
+from benchmarks import print_latencies
+from channel_registry import ChannelFeature
+from diablo_elixir_alerter import DiabloElixirAlerter
+from diablo_events import EventsClient
+from diablo_events_alerter import DiabloEventsAlerter
+from fakes import OPUS_FRAME_DURATION, FakeDeployment, FakeGuild, FakeMember, FakeVoiceChannel, FakeVoiceState, StubEventsServer, first_frame_latencies, voice_state_update
+from introducer import IntroducerCog
+from trace_recorder import TraceRecord, read_trace
+
+LOG = logging.getLogger( __name__ )
+
+DRAIN_POLL_INTERVAL = 0.05
+
+EVENT_TIMESTAMP_FIELDS = {
+    'boss': ( 'timestamp', 'expected', 'nextExpected' ),
+    'legion': ( 'timestamp', 'expected', 'nextExpected' ),
+    'helltide': ( 'timestamp', ),
+}
+
+def shift_events_body( body: str, recorded_wall_time: float, replay_wall_time: float, speed: float ) -> bytes:
+    data: dict[ str, Any ] = json.loads( body )
+    for event_name, fields in EVENT_TIMESTAMP_FIELDS.items():
+        event = data.get( event_name )
+        if not isinstance( event, dict ):
+            continue
+        event = cast( dict[ str, Any ], event )
+        for field_name in fields:
+            if isinstance( event.get( field_name ), int ):
+                event[ field_name ] = int( replay_wall_time + ( event[ field_name ] - recorded_wall_time ) / speed )
+    return json.dumps( data ).encode( 'utf-8' )
+
+class TraceReplayer:
+    def __init__( self, deployment: FakeDeployment ) -> None:
+        self.deployment = deployment
+        self.joins: dict[ int, list[ float ] ] = {}
+
+    def ensure_guild( self, guild_id: int, name: str | None = None ) -> FakeGuild:
+        guild = self.deployment.bot.get_guild( guild_id )
+        if guild is None:
+            guild = self.deployment.bot.add_guild( name or f'Guild {guild_id}', guild_id=guild_id, frame_interval=self.deployment.frame_interval )
+        return guild
+
+    def ensure_channel( self, guild: FakeGuild, channel_id: int, name: str | None = None ) -> FakeVoiceChannel:
+        channel = guild.get_channel( channel_id )
+        if channel is None:
+            channel = guild.create_voice_channel( name or f'Channel {channel_id}', channel_id=channel_id )
+            self.deployment.channels.append( channel )
+        return channel
+
+    def ensure_member( self, guild: FakeGuild, record: TraceRecord ) -> FakeMember:
+        member = guild.get_member( record[ 'id' ] )
+        if member is None:
+            member = guild.add_member( record[ 'name' ], member_id=record[ 'id' ], nick=record.get( 'nick' ), bot=record.get( 'bot', False ) )
+        else:
+            member.nick = record.get( 'nick' )
+        return member
+
+    async def apply_snapshot( self, record: TraceRecord, initial: bool ):
+        for guild_record in record[ 'guilds' ]:
+            guild = self.ensure_guild( guild_record[ 'id' ], guild_record[ 'name' ] )
+            for channel_record in guild_record[ 'channels' ]:
+                self.ensure_channel( guild, channel_record[ 'id' ], channel_record[ 'name' ] )
+            if initial:
+                for member_record in guild_record[ 'voice_members' ]:
+                    member = self.ensure_member( guild, member_record )
+                    guild.move_member( member, self.ensure_channel( guild, member_record[ 'channel_id' ] ) )
+
+        for guild_id, channel_id, features in record[ 'registered' ]:
+            await self.deployment.registry.register( guild_id, channel_id, ChannelFeature( features ) )
+
+    def apply_voice_state( self, record: TraceRecord ) -> tuple[ FakeMember, FakeVoiceState, FakeVoiceState ]:
+        guild = self.ensure_guild( record[ 'guild_id' ] )
+        member = self.ensure_member( guild, record[ 'member' ] )
+        channel = self.ensure_channel( guild, record[ 'after' ] ) if record[ 'after' ] is not None else None
+
+        before, after = guild.move_member( member, channel )
+        if channel is not None and before.channel != channel and not member.bot:
+            self.joins.setdefault( channel.id, [] ).append( time.perf_counter() )
+        return member, before, after
+
+async def replay_trace( trace_path: Path, speed: float, max_gap: float | None, linger: float, frame_interval: float, prewarm: bool ):
+    records = list( read_trace( trace_path ) )
+    header = records[ 0 ]
+    if header.get( 'type' ) != 'header':
+        raise ValueError( f'Not a trace file: {trace_path}' )
+
+    snapshots = [ r for r in records if r[ 'type' ] == 'snapshot' ]
+    timeline = [ r for r in records if r[ 'type' ] in ( 'voice_state', 'events_body', 'events_poll' ) ]
+    recorded_polls = sum( r[ 'type' ] == 'events_poll' for r in timeline )
+    print( f'trace: {len( records )} record(s), {len( snapshots )} snapshot(s), {sum( r[ "type" ] == "voice_state" for r in timeline )} voice state update(s), {sum( r[ "type" ] == "events_body" for r in timeline )} events body(s), {recorded_polls} events poll(s)' )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        deployment = FakeDeployment( Path( tmp_dir ), frame_interval=frame_interval )
+        replayer = TraceReplayer( deployment )
+
+        for i, snapshot in enumerate( snapshots ):
+            await replayer.apply_snapshot( snapshot, initial=i == 0 )
+
+        stub = StubEventsServer()
+        await stub.start()
+
+        def events_body( record: TraceRecord ) -> bytes:
+            return shift_events_body( record[ 'body' ], record[ 'wall_time' ], time.time(), speed )
+
+        first_body = next( ( r for r in timeline if r[ 'type' ] == 'events_body' ), None )
+        if first_body is not None:
+            stub.set_body( events_body( first_body ) )
+
+        introducer = IntroducerCog( deployment.bot.as_bot(), deployment.registry, deployment.tts, deployment.sound_cache, deployment.intro_sounds, deployment.welcome_sounds, deployment.voice_connections, deployment.playback )
+        elixir_alerter = DiabloElixirAlerter( deployment.bot.as_bot(), deployment.registry, deployment.sound_cache, deployment.voice_connections, deployment.playback )
+        events_alerter = DiabloEventsAlerter( deployment.bot.as_bot(), deployment.registry, deployment.tts, deployment.sound_cache, deployment.voice_connections, deployment.playback, events_client=EventsClient( stub.url ), poll_events=recorded_polls == 0 )
+        elixir_alerter.alert_lateness = deque()
+        events_alerter.alert_lateness = deque()
+
+        await elixir_alerter.on_ready()
+        if prewarm:
+            await introducer.on_ready()
+            await introducer.prewarm_queue.join()
+
+        dispatch_times: list[ float ] = []
+
+        start = time.perf_counter()
+        virtual_time = timeline[ 0 ][ 't' ] if timeline else 0.0
+        offset = 0.0
+        for record in timeline:
+            gap = ( record[ 't' ] - virtual_time ) / speed
+            virtual_time = record[ 't' ]
+            offset += min( gap, max_gap ) if max_gap is not None else gap
+
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep( delay )
+
+            if record[ 'type' ] == 'events_body':
+                stub.set_body( events_body( record ) )
+                continue
+
+            if record[ 'type' ] == 'events_poll':
+                if record[ 'result' ] == 'error':
+                    stub.failures_pending += 1
+                await events_alerter.poll_events()
+                continue
+
+            member, before, after = replayer.apply_voice_state( record )
+
+            dispatch_start = time.perf_counter()
+            await introducer.on_voice_state_update( *voice_state_update( member, before, after ) )
+            await elixir_alerter.on_voice_state_update( *voice_state_update( member, before, after ) )
+            dispatch_times.append( time.perf_counter() - dispatch_start )
+
+        if linger > 0:
+            await asyncio.sleep( linger )
+
+        while introducer.intro_tasks or deployment.playback.queue_depth() > 0 or deployment.is_playing():
+            await asyncio.sleep( DRAIN_POLL_INTERVAL )
+        elapsed = time.perf_counter() - start
+
+        latencies: list[ float ] = []
+        unintroduced = 0
+        for channel in deployment.channels:
+            guild = channel.fake_guild
+            channel_latencies, channel_missed = first_frame_latencies( replayer.joins.get( channel.id, [] ), guild.first_frame_times( channel.id ) )
+            latencies.extend( channel_latencies )
+            unintroduced += channel_missed
+
+        await introducer.cog_unload()
+        await elixir_alerter.cog_unload()
+        await events_alerter.cog_unload()
+        await stub.stop()
+
+    print_latencies( 'on_voice_state_update', dispatch_times, elapsed, unit='us' )
+    print_latencies( 'join -> first frame', latencies, elapsed )
+    print_latencies( 'voice handshake', list( deployment.voice_connections.join_latencies ), elapsed )
+    print_latencies( 'event alert lateness', [ l.total_seconds() for l in events_alerter.alert_lateness ], elapsed )
+    print_latencies( 'elixir alert lateness', [ l.total_seconds() for l in elixir_alerter.alert_lateness ], elapsed )
+    print( f'unintroduced joins={unintroduced} elapsed={elapsed:.2f}s speed={speed}x events polls={stub.requests}' )
+    print( f'playback: discarded={deployment.playback.discarded} preempted={deployment.playback.preempted}' )
+
+def main():
+    parser = argparse.ArgumentParser( description='Replay a recorded voice state and events feed trace against fake Discord clients' )
+    parser.add_argument( 'trace', type=Path )
+    parser.add_argument( '--speed', type=float, default=1.0, help='compress gaps between trace records by this factor' )
+    parser.add_argument( '--max-gap', type=float, help='cap on replayed idle gaps in seconds, after speed-up' )
+    parser.add_argument( '--linger', type=float, default=0.0, help='seconds to keep running after the last record so scheduled alerts can fire' )
+    parser.add_argument( '--frame-interval', type=float, default=OPUS_FRAME_DURATION, help='seconds per fake Opus frame, 0 to play instantly' )
+    parser.add_argument( '--prewarm', action='store_true' )
+    parser.add_argument( '--verbose', action='store_true' )
+    args = parser.parse_args()
+
+    logging.basicConfig( level=logging.INFO if args.verbose else logging.WARNING )
+
+    asyncio.run( replay_trace( args.trace, args.speed, args.max_gap, args.linger, args.frame_interval, args.prewarm ) )
+
+if __name__ == '__main__':
+    main()
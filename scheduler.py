@@ -0,0 +1,132 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Hashable
+
+LOG = logging.getLogger( __name__ )
+
+LATENESS_HISTORY = 100
+
+TimerCallback = Callable[ [], Awaitable[ None ] ]
+
+@dataclass
+class _Timer:
+    when: datetime
+    deadline: float
+    seq: int
+    callback: TimerCallback
+
+class DeadlineScheduler:
+    def __init__( self, name: str ) -> None:
+        self.name = name
+
+        self.heap: list[ tuple[ float, int, Hashable ] ] = []
+        self.timers: dict[ Hashable, _Timer ] = {}
+        self.seq = itertools.count()
+
+        self.changed = asyncio.Event()
+        self.runner: asyncio.Task[ None ] | None = None
+        self.callbacks: set[ asyncio.Task[ None ] ] = set()
+
+        self.wakeups = 0
+        self.lateness: deque[ float ] = deque( maxlen=LATENESS_HISTORY )
+
+    @property
+    def pending( self ) -> int:
+        return len( self.timers )
+
+    def next_deadline( self ) -> datetime | None:
+        self._discard_stale()
+        if not self.heap:
+            return None
+        return self.timers[ self.heap[ 0 ][ 2 ] ].when
+
+    def is_scheduled( self, key: Hashable ) -> bool:
+        return key in self.timers
+
+    def schedule( self, key: Hashable, when: datetime, callback: TimerCallback ):
+        loop = asyncio.get_running_loop()
+
+        deadline = loop.time() + ( when - datetime.now( tz=timezone.utc ) ).total_seconds()
+        seq = next( self.seq )
+
+        self.timers[ key ] = _Timer( when=when, deadline=deadline, seq=seq, callback=callback )
+        heapq.heappush( self.heap, ( deadline, seq, key ) )
+
+        if self.heap[ 0 ][ 1 ] == seq:
+            self.changed.set()
+
+        if self.runner is None or self.runner.done():
+            self.runner = asyncio.create_task( self._run(), name=f'{self.name}-scheduler' )
+
+    def cancel( self, key: Hashable ) -> bool:
+        return self.timers.pop( key, None ) is not None
+
+    def clear( self ):
+        self.timers.clear()
+        self.heap.clear()
+        self.changed.set()
+
+    def stop( self ):
+        self.clear()
+
+        if self.runner is not None:
+            self.runner.cancel()
+            self.runner = None
+
+        for task in self.callbacks:
+            task.cancel()
+
+    def _discard_stale( self ):
+        while self.heap:
+            _, seq, key = self.heap[ 0 ]
+            timer = self.timers.get( key )
+            if timer is not None and timer.seq == seq:
+                return
+            heapq.heappop( self.heap )
+
+    async def _fire( self, key: Hashable, callback: TimerCallback ):
+        try:
+            await callback()
+        except Exception as ex:
+            LOG.error( f'Scheduled callback failed: {self.name} - {key}', exc_info=ex )
+
+    async def _run( self ):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            self._discard_stale()
+
+            self.changed.clear()
+            if not self.heap:
+                await self.changed.wait()
+                continue
+
+            delay = self.heap[ 0 ][ 0 ] - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for( self.changed.wait(), delay )
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            self.wakeups += 1
+
+            now = loop.time()
+            while self.heap and self.heap[ 0 ][ 0 ] <= now:
+                deadline, seq, key = heapq.heappop( self.heap )
+                timer = self.timers.get( key )
+                if timer is None or timer.seq != seq:
+                    continue
+
+                del self.timers[ key ]
+                self.lateness.append( now - deadline )
+
+                task = asyncio.create_task( self._fire( key, timer.callback ) )
+                self.callbacks.add( task )
+                task.add_done_callback( self.callbacks.discard )
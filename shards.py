@@ -0,0 +1,289 @@
+import asyncio
+import base64
+import dataclasses
+import itertools
+import json
+import logging
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from diablo_events import DiabloEvents, EventsClient, decode_diablo_events
+from diablo_events_predictor import predict_transition_times
+from poll_interval import AdaptivePollInterval
+from tts import TTS, TTSBackend, TTSRequest
+
+LOG = logging.getLogger( __name__ )
+
+IPC_STREAM_LIMIT = 16 * 1024 * 1024
+IPC_TTS_TIMEOUT = 30.0
+CONNECT_RETRY_INTERVAL = 1.0
+MAX_CONNECT_RETRY_INTERVAL = 30.0
+
+Message = dict[ str, Any ]
+
+def encode_message( message: Message ) -> bytes:
+    return json.dumps( message, separators=( ',', ':' ) ).encode( 'utf-8' ) + b'\n'
+
+def worker_shard_ids( worker_index: int, workers: int, shard_count: int ) -> list[ int ]:
+    return [ shard_id for shard_id in range( shard_count ) if shard_id % workers == worker_index ]
+
+class ShardCoordinator:
+    def __init__( self, socket_path: Path, tts: TTS, events_client: EventsClient ) -> None:
+        self.socket_path = socket_path
+        self.tts = tts
+        self.events_client = events_client
+
+        self.poll_interval = AdaptivePollInterval()
+        self.events_body: str | None = None
+
+        self.server: asyncio.AbstractServer | None = None
+        self.poller: asyncio.Task[ None ] | None = None
+        self.workers: set[ asyncio.StreamWriter ] = set()
+        self.worker_handlers: set[ asyncio.Task[ Any ] ] = set()
+        self.requests: set[ asyncio.Task[ None ] ] = set()
+
+        self.tts_requests = 0
+
+    async def start( self ):
+        self.socket_path.parent.mkdir( parents=True, exist_ok=True )
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        self.server = await asyncio.start_unix_server( self._handle_worker, path=str( self.socket_path ), limit=IPC_STREAM_LIMIT )
+        self.poller = asyncio.create_task( self._poll_events(), name='coordinator-events-poll' )
+
+        LOG.info( f'Shard coordinator listening on {self.socket_path}' )
+
+    async def stop( self ):
+        if self.poller is not None:
+            self.poller.cancel()
+            self.poller = None
+
+        if self.server is not None:
+            self.server.close()
+
+        for task in self.requests:
+            task.cancel()
+        await asyncio.gather( *self.requests, return_exceptions=True )
+
+        for writer in self.workers:
+            writer.close()
+        await asyncio.gather( *self.worker_handlers, return_exceptions=True )
+
+        if self.server is not None:
+            await self.server.wait_closed()
+            self.server = None
+
+        await self.events_client.close()
+
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+    async def _send( self, writer: asyncio.StreamWriter, message: Message ):
+        try:
+            writer.write( encode_message( message ) )
+            await writer.drain()
+        except ConnectionError as ex:
+            LOG.debug( f'Failed to send {message[ "type" ]} message to shard worker: {ex!r}' )
+
+    async def _broadcast( self, message: Message ):
+        await asyncio.gather( *( self._send( w, message ) for w in list( self.workers ) ) )
+
+    async def _poll_events( self ):
+        while True:
+            try:
+                events = await self.events_client.get_events()
+
+                assert self.events_client.body is not None
+                body = self.events_client.body.decode( 'utf-8' )
+                if body != self.events_body:
+                    LOG.debug( f'Publishing new Diablo events to {len( self.workers )} shard worker(s): {events}' )
+                    self.events_body = body
+                    await self._broadcast( { 'type': 'events', 'body': body } )
+
+                now = datetime.now( tz=timezone.utc )
+                interval = self.poll_interval.record_success( now, predict_transition_times( events, now ) )
+            except Exception as ex:
+                interval = self.poll_interval.record_failure()
+                LOG.warning( f'Failed to retrieve Diablo events (failure streak: {self.poll_interval.failure_streak})', exc_info=ex )
+
+            LOG.debug( f'Next Diablo events poll in {interval}' )
+            await asyncio.sleep( interval.total_seconds() )
+
+    async def _handle_worker( self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter ):
+        handler = asyncio.current_task()
+        assert handler is not None
+        self.worker_handlers.add( handler )
+
+        self.workers.add( writer )
+        LOG.info( f'Shard worker connected ({len( self.workers )} connected)' )
+
+        try:
+            if self.events_body is not None:
+                await self._send( writer, { 'type': 'events', 'body': self.events_body } )
+
+            while line := await reader.readline():
+                message: Message = json.loads( line )
+                if message[ 'type' ] == 'tts':
+                    task = asyncio.create_task( self._handle_tts( writer, message ) )
+                    self.requests.add( task )
+                    task.add_done_callback( self.requests.discard )
+                else:
+                    LOG.warning( f'Unknown message from shard worker: {message[ "type" ]}' )
+        except ( ConnectionError, ValueError ) as ex:
+            LOG.warning( 'Shard worker connection failed', exc_info=ex )
+        finally:
+            self.workers.discard( writer )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            LOG.info( f'Shard worker disconnected ({len( self.workers )} connected)' )
+            self.worker_handlers.discard( handler )
+
+    async def _generate_tts( self, request: TTSRequest, deadline: float | None ) -> bytes:
+        return await self.tts.generate_tts(
+            request.text,
+            ssml=request.ssml,
+            language_code=request.language_code,
+            voice_name=request.voice_name,
+            pitch=request.pitch,
+            speed=request.speed,
+            deadline=deadline,
+            fallback=deadline is not None,
+        )
+
+    async def _handle_tts( self, writer: asyncio.StreamWriter, message: Message ):
+        request = TTSRequest( **message[ 'request' ] )
+
+        self.tts_requests += 1
+        try:
+            audio_content = await self._generate_tts( request, message.get( 'deadline' ) )
+        except Exception as ex:
+            await self._send( writer, { 'type': 'tts_error', 'id': message[ 'id' ], 'error': repr( ex ) } )
+            return
+
+        await self._send( writer, { 'type': 'tts_result', 'id': message[ 'id' ], 'audio': base64.b64encode( audio_content ).decode( 'ascii' ) } )
+
+class ShardClient:
+    def __init__( self, socket_path: Path, on_events: Callable[ [ DiabloEvents ], None ] | None = None ) -> None:
+        self.socket_path = socket_path
+        self.on_events = on_events
+
+        self.events: DiabloEvents | None = None
+
+        self.writer: asyncio.StreamWriter | None = None
+        self.connected = asyncio.Event()
+        self.connection: asyncio.Task[ None ] | None = None
+
+        self.request_ids = itertools.count( 1 )
+        self.pending: dict[ int, asyncio.Future[ bytes ] ] = {}
+
+    def start( self ):
+        if self.connection is None:
+            self.connection = asyncio.create_task( self._run(), name='shard-client' )
+
+    async def close( self ):
+        if self.connection is not None:
+            self.connection.cancel()
+            self.connection = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def _run( self ):
+        retry_interval = CONNECT_RETRY_INTERVAL
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection( str( self.socket_path ), limit=IPC_STREAM_LIMIT )
+            except OSError as ex:
+                LOG.debug( f'Shard coordinator not reachable at {self.socket_path}: {ex!r}' )
+                await asyncio.sleep( retry_interval )
+                retry_interval = min( retry_interval * 2, MAX_CONNECT_RETRY_INTERVAL )
+                continue
+
+            LOG.info( f'Connected to shard coordinator: {self.socket_path}' )
+            retry_interval = CONNECT_RETRY_INTERVAL
+            self.writer = writer
+            self.connected.set()
+
+            try:
+                await self._read( reader )
+            except ( ConnectionError, ValueError ) as ex:
+                LOG.warning( 'Shard coordinator connection failed', exc_info=ex )
+            finally:
+                self.connected.clear()
+                self.writer = None
+                writer.close()
+
+                for future in self.pending.values():
+                    if not future.done():
+                        future.set_exception( ConnectionError( 'Lost connection to shard coordinator' ) )
+                self.pending.clear()
+
+            LOG.warning( 'Disconnected from shard coordinator, reconnecting' )
+            await asyncio.sleep( retry_interval )
+
+    async def _read( self, reader: asyncio.StreamReader ):
+        while line := await reader.readline():
+            message: Message = json.loads( line )
+
+            if message[ 'type' ] == 'events':
+                try:
+                    events = decode_diablo_events( message[ 'body' ] )
+                except Exception as ex:
+                    LOG.warning( 'Failed to decode Diablo events from shard coordinator', exc_info=ex )
+                    continue
+
+                self.events = events
+                if self.on_events is not None:
+                    self.on_events( events )
+                continue
+
+            future = self.pending.pop( message.get( 'id', 0 ), None )
+            if future is None or future.done():
+                continue
+
+            if message[ 'type' ] == 'tts_result':
+                future.set_result( base64.b64decode( message[ 'audio' ] ) )
+            elif message[ 'type' ] == 'tts_error':
+                future.set_exception( RuntimeError( f'Shard coordinator TTS failed: {message[ "error" ]}' ) )
+
+    async def synthesize( self, request: TTSRequest, deadline: float | None ) -> bytes:
+        await asyncio.wait_for( self.connected.wait(), timeout=IPC_TTS_TIMEOUT )
+
+        writer = self.writer
+        if writer is None or writer.is_closing():
+            raise ConnectionError( 'Not connected to shard coordinator' )
+
+        request_id = next( self.request_ids )
+        future: asyncio.Future[ bytes ] = asyncio.get_running_loop().create_future()
+        self.pending[ request_id ] = future
+
+        try:
+            writer.write( encode_message( { 'type': 'tts', 'id': request_id, 'request': dataclasses.asdict( request ), 'deadline': deadline } ) )
+            await writer.drain()
+            return await asyncio.wait_for( future, timeout=IPC_TTS_TIMEOUT )
+        finally:
+            self.pending.pop( request_id, None )
+
+class ShardTTSBackend( TTSBackend ):
+    name = 'coordinator'
+    encoding = 'AUTO'
+
+    def __init__( self, client: ShardClient ) -> None:
+        self.client = client
+
+    async def synthesize( self, request: TTSRequest ) -> bytes:
+        return await self.client.synthesize( request, None )
+
+class ShardTTS( TTS ):
+    def __init__( self, client: ShardClient ) -> None:
+        super().__init__( backend=ShardTTSBackend( client ) )
+        self.client = client
+
+    async def _generate_with_deadline( self, request: TTSRequest, deadline: float | None ) -> bytes:
+        return await self.client.synthesize( request, deadline )
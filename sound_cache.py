@@ -0,0 +1,113 @@
+import asyncio
+import io
+import logging
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Sequence
+
+import discord
+
+from metrics import FFMPEG_SPAWNS
+
+LOG = logging.getLogger( __name__ )
+
+DEFAULT_MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+class CachedOpusAudio( discord.AudioSource ):
+    def __init__( self, frames: Sequence[ bytes ] ) -> None:
+        self.frames = frames
+        self.index = 0
+        self.on_first_frame: Callable[ [], None ] | None = None
+
+    def read( self ) -> bytes:
+        if self.index >= len( self.frames ):
+            return b''
+
+        if self.index == 0 and self.on_first_frame is not None:
+            self.on_first_frame()
+
+        frame = self.frames[ self.index ]
+        self.index += 1
+        return frame
+
+    def is_opus( self ) -> bool:
+        return True
+
+def _decode_opus_frames( audio: Path | bytes ) -> tuple[ bytes, ... ]:
+    if isinstance( audio, bytes ):
+        FFMPEG_SPAWNS.inc( source='bytes' )
+        source = discord.FFmpegOpusAudio( source=io.BytesIO( audio ), pipe=True )
+    else:
+        FFMPEG_SPAWNS.inc( source='file' )
+        source = discord.FFmpegOpusAudio( source=str( audio ) )
+    try:
+        frames: list[ bytes ] = []
+        while frame := source.read():
+            frames.append( frame )
+        return tuple( frames )
+    finally:
+        source.cleanup()
+
+class SoundCache:
+    def __init__( self, max_bytes: int = DEFAULT_MAX_CACHE_BYTES, decoder: Callable[ [ Path | bytes ], tuple[ bytes, ... ] ] = _decode_opus_frames ) -> None:
+        self.max_bytes = max_bytes
+        self.decoder = decoder
+        self.size_bytes = 0
+
+        self.entries: OrderedDict[ Path, tuple[ bytes, ... ] ] = OrderedDict()
+        self.pending: dict[ Path, asyncio.Future[ tuple[ bytes, ... ] ] ] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _store( self, path: Path, frames: tuple[ bytes, ... ] ):
+        frames_size = sum( len( f ) for f in frames )
+        if frames_size > self.max_bytes:
+            LOG.warning( f'Sound is too large to cache: {path} ({frames_size} bytes)' )
+            return
+
+        self.entries[ path ] = frames
+        self.size_bytes += frames_size
+
+        while self.size_bytes > self.max_bytes:
+            evicted_path, evicted_frames = self.entries.popitem( last=False )
+            self.size_bytes -= sum( len( f ) for f in evicted_frames )
+            LOG.debug( f'Evicted sound from cache: {evicted_path}' )
+
+    async def get_frames( self, path: Path ) -> tuple[ bytes, ... ]:
+        frames = self.entries.get( path )
+        if frames is not None:
+            self.hits += 1
+            self.entries.move_to_end( path )
+            return frames
+
+        pending = self.pending.get( path )
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield( pending )
+
+        self.misses += 1
+
+        future = asyncio.get_running_loop().run_in_executor( None, self.decoder, path )
+        self.pending[ path ] = future
+        try:
+            frames = await asyncio.shield( future )
+        finally:
+            del self.pending[ path ]
+
+        LOG.debug( f'Decoded sound into cache: {path} ({len( frames )} frames)' )
+        self._store( path, frames )
+
+        return frames
+
+    async def decode( self, audio_content: bytes ) -> tuple[ bytes, ... ]:
+        return await asyncio.get_running_loop().run_in_executor( None, self.decoder, audio_content )
+
+    async def get_audio( self, path: Path ) -> CachedOpusAudio:
+        return CachedOpusAudio( await self.get_frames( path ) )
+
+    def invalidate( self, path: Path ):
+        frames = self.entries.pop( path, None )
+        if frames is not None:
+            self.size_bytes -= sum( len( f ) for f in frames )
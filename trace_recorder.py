@@ -0,0 +1,110 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Iterator
+
+import discord
+
+from discord.ext import commands
+
+from channel_registry import ChannelRegistry
+
+LOG = logging.getLogger( __name__ )
+
+TRACE_VERSION = 2
+
+TraceRecord = dict[ str, Any ]
+
+def _member_record( member: discord.Member ) -> TraceRecord:
+    return {
+        'id': member.id,
+        'name': member.name,
+        'nick': member.nick,
+        'bot': member.bot,
+    }
+
+class TraceRecorder:
+    def __init__( self, path: Path ) -> None:
+        self.path = path
+        self.start = time.monotonic()
+        self.records = 0
+
+        self.queue: queue.SimpleQueue[ TraceRecord | None ] = queue.SimpleQueue()
+        self.writer = threading.Thread( target=self._write, name='trace-writer', daemon=True )
+
+        self.path.parent.mkdir( parents=True, exist_ok=True )
+        self.file = gzip.open( self.path, 'wt', encoding='utf-8' )
+        self.writer.start()
+
+        self.record( 'header', version=TRACE_VERSION, wall_time=time.time() )
+
+    def _write( self ):
+        while ( record := self.queue.get() ) is not None:
+            self.file.write( json.dumps( record, separators=( ',', ':' ) ) )
+            self.file.write( '\n' )
+        self.file.close()
+
+    def record( self, record_type: str, **fields: Any ):
+        self.records += 1
+        self.queue.put( { 't': round( time.monotonic() - self.start, 4 ), 'type': record_type, **fields } )
+
+    def record_events_body( self, body: bytes ):
+        self.record( 'events_body', wall_time=time.time(), body=body.decode( 'utf-8' ) )
+
+    def record_events_poll( self, result: str ):
+        self.record( 'events_poll', result=result )
+
+    def close( self ):
+        self.queue.put( None )
+        self.writer.join()
+        LOG.info( f'Wrote {self.records} trace record(s) to {self.path}' )
+
+def read_trace( path: Path ) -> Iterator[ TraceRecord ]:
+    with gzip.open( path, 'rt', encoding='utf-8' ) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads( line )
+
+class TraceRecorderCog( commands.Cog ):
+    def __init__( self, bot: commands.Bot, registry: ChannelRegistry, recorder: TraceRecorder ) -> None:
+        self.bot = bot
+        self.registry = registry
+        self.recorder = recorder
+
+    def _guild_record( self, guild: discord.Guild ) -> TraceRecord:
+        return {
+            'id': guild.id,
+            'name': guild.name,
+            'channels': [ { 'id': c.id, 'name': c.name } for c in guild.voice_channels ],
+            'voice_members': [ { **_member_record( m ), 'channel_id': c.id } for c in guild.voice_channels for m in c.members ],
+        }
+
+    def _record_snapshot( self, guilds: list[ discord.Guild ] ):
+        self.recorder.record(
+            'snapshot',
+            guilds=[ self._guild_record( g ) for g in guilds ],
+            registered=[ [ c.guild_id, c.channel_id, c.features.value ] for c in self.registry.channels.values() if c.features ],
+        )
+
+    @commands.Cog.listener()
+    async def on_ready( self ):
+        self._record_snapshot( self.bot.guilds )
+
+    @commands.Cog.listener()
+    async def on_guild_join( self, guild: discord.Guild ):
+        self._record_snapshot( [ guild ] )
+
+    @commands.Cog.listener()
+    async def on_voice_state_update( self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState ):
+        self.recorder.record(
+            'voice_state',
+            guild_id=member.guild.id,
+            member=_member_record( member ),
+            before=before.channel.id if before.channel else None,
+            after=after.channel.id if after.channel else None,
+        )
@@ -1,41 +1,276 @@
+import asyncio
+import io
+import logging
+import shutil
+import time
+import wave
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
 from google.cloud import texttospeech_v1 as gtts
 
-class TTS:
+from metrics import TTS_BACKEND_LATENCY, TTS_LATENCY
+from tts_cache import TTSCache, tts_cache_key
+
+LOG = logging.getLogger( __name__ )
+
+ESPEAK_EXECUTABLE = 'espeak-ng'
+ESPEAK_DEFAULT_PITCH = 50
+ESPEAK_DEFAULT_WORDS_PER_MINUTE = 175
+
+FAKE_SAMPLE_RATE = 22050
+FAKE_SECONDS_PER_CHARACTER = 0.06
+
+@dataclass( frozen=True, slots=True )
+class TTSRequest:
+    text: str
+    ssml: bool
+    language_code: str
+    voice_name: str
+    pitch: float | None
+    speed: float | None
+
+class TTSBackend( ABC ):
+    name: str
+    encoding: str
+
+    @abstractmethod
+    async def synthesize( self, request: TTSRequest ) -> bytes:
+        ...
+
+class GoogleTTSBackend( TTSBackend ):
+    name = 'google'
+    encoding = gtts.AudioEncoding.MP3.name
+
     def __init__( self ) -> None:
         self.gtts_client = gtts.TextToSpeechAsyncClient()
 
-    async def generate_tts( self, text: str, *, ssml: bool = False, language_code: str = 'en-US', voice_name: str = 'en-US-Neural2-C', pitch: float | None = None, speed: float | None = None ) -> bytes:
+    async def synthesize( self, request: TTSRequest ) -> bytes:
         tts_input = gtts.SynthesisInput()
-        if ssml:
-            tts_input.ssml = text
+        if request.ssml:
+            tts_input.ssml = request.text
         else:
-            tts_input.text = text
+            tts_input.text = request.text
 
         audio_config = gtts.AudioConfig()
         audio_config.audio_encoding = gtts.AudioEncoding.MP3
         audio_config.effects_profile_id = [ 'headphone-class-device' ]
-        if pitch is not None:
-            audio_config.pitch = pitch
-        if speed is not None:
-            audio_config.speaking_rate = speed
+        if request.pitch is not None:
+            audio_config.pitch = request.pitch
+        if request.speed is not None:
+            audio_config.speaking_rate = request.speed
 
         voice = gtts.VoiceSelectionParams()
-        voice.language_code = language_code
-        voice.name = voice_name
+        voice.language_code = request.language_code
+        voice.name = request.voice_name
 
-        request = gtts.SynthesizeSpeechRequest(
+        synthesize_request = gtts.SynthesizeSpeechRequest(
             input=tts_input,
             audio_config=audio_config,
             voice=voice,
         )
 
-        response = await self.gtts_client.synthesize_speech( request=request )
+        response = await self.gtts_client.synthesize_speech( request=synthesize_request )
 
         return response.audio_content
 
-if __name__ == '__main__':
-    import asyncio
+class EspeakTTSBackend( TTSBackend ):
+    name = 'espeak-ng'
+    encoding = 'WAV'
+
+    def __init__( self, executable: str = ESPEAK_EXECUTABLE ) -> None:
+        self.executable = executable
+
+    @staticmethod
+    def is_available( executable: str = ESPEAK_EXECUTABLE ) -> bool:
+        return shutil.which( executable ) is not None
+
+    def _args( self, request: TTSRequest ) -> list[ str ]:
+        args = [ self.executable, '--stdout', '-v', request.language_code.lower() ]
+        if request.ssml:
+            args.append( '-m' )
+        if request.pitch is not None:
+            args.extend( [ '-p', str( max( 0, min( 99, round( ESPEAK_DEFAULT_PITCH + request.pitch * 2.5 ) ) ) ) ] )
+        if request.speed is not None:
+            args.extend( [ '-s', str( round( ESPEAK_DEFAULT_WORDS_PER_MINUTE * request.speed ) ) ] )
+        args.extend( [ '--', request.text ] )
+        return args
+
+    async def synthesize( self, request: TTSRequest ) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            *self._args( request ),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+            raise
+
+        if process.returncode != 0:
+            raise RuntimeError( f'{self.executable} exited with code {process.returncode}: {stderr.decode( errors="replace" ).strip()}' )
+
+        return stdout
+
+class FakeTTSBackend( TTSBackend ):
+    name = 'fake'
+    encoding = 'WAV'
+
+    def __init__( self, latency: float = 0.0 ) -> None:
+        self.latency = latency
+        self.requests: list[ TTSRequest ] = []
+
+    async def synthesize( self, request: TTSRequest ) -> bytes:
+        self.requests.append( request )
+        if self.latency > 0:
+            await asyncio.sleep( self.latency )
+
+        frames = int( FAKE_SAMPLE_RATE * FAKE_SECONDS_PER_CHARACTER * max( 1, len( request.text ) ) )
+
+        buffer = io.BytesIO()
+        with wave.open( buffer, 'wb' ) as wav:
+            wav.setnchannels( 1 )
+            wav.setsampwidth( 2 )
+            wav.setframerate( FAKE_SAMPLE_RATE )
+            wav.writeframes( b'\0\0' * frames )
+        return buffer.getvalue()
+
+class TTS:
+    def __init__(
+        self,
+        cache: TTSCache | None = None,
+        backend: TTSBackend | None = None,
+        fallback: TTSBackend | None = None,
+        default_deadline: float | None = None,
+    ) -> None:
+        self.backend = backend or GoogleTTSBackend()
+        self.fallback = fallback
+        self.cache = cache
+        self.default_deadline = default_deadline
+
+        self.background_tasks: set[ asyncio.Task[ bytes ] ] = set()
+        self.in_flight: dict[ tuple[ str, TTSRequest ], asyncio.Future[ bytes ] ] = {}
+        self.hedged = 0
+        self.fallbacks = 0
+        self.deduplicated = 0
 
+    async def generate_tts(
+        self,
+        text: str,
+        *,
+        ssml: bool = False,
+        language_code: str = 'en-US',
+        voice_name: str = 'en-US-Neural2-C',
+        pitch: float | None = None,
+        speed: float | None = None,
+        deadline: float | None = None,
+        fallback: bool = True,
+    ) -> bytes:
+        request = TTSRequest( text=text, ssml=ssml, language_code=language_code, voice_name=voice_name, pitch=pitch, speed=speed )
+
+        if not fallback:
+            deadline = None
+        elif deadline is None:
+            deadline = self.default_deadline
+
+        start = time.perf_counter()
+        try:
+            return await self._generate_with_deadline( request, deadline )
+        finally:
+            TTS_LATENCY.observe( time.perf_counter() - start )
+
+    async def _generate_with_deadline( self, request: TTSRequest, deadline: float | None ) -> bytes:
+        if self.fallback is None or deadline is None:
+            return await self._generate( self.backend, request )
+
+        primary = self._track( asyncio.create_task( self._generate( self.backend, request ) ) )
+        done, _ = await asyncio.wait( { primary }, timeout=deadline )
+
+        if primary in done:
+            ex = primary.exception()
+            if ex is None:
+                return primary.result()
+
+            LOG.warning( f'{self.backend.name} TTS failed, falling back to {self.fallback.name}: "{request.text}"', exc_info=ex )
+            self.fallbacks += 1
+            return await self._generate( self.fallback, request )
+
+        LOG.warning( f'{self.backend.name} TTS missed its {deadline:.2f}s deadline, hedging with {self.fallback.name}: "{request.text}"' )
+        self.hedged += 1
+
+        fallback = self._track( asyncio.create_task( self._generate( self.fallback, request ) ) )
+        done, _ = await asyncio.wait( { primary, fallback }, return_when=asyncio.FIRST_COMPLETED )
+
+        for task in ( primary, fallback ):
+            if task in done and task.exception() is None:
+                return task.result()
+
+        return await ( fallback if primary in done else primary )
+
+    def _track( self, task: asyncio.Task[ bytes ] ) -> asyncio.Task[ bytes ]:
+        self.background_tasks.add( task )
+        task.add_done_callback( self._untrack )
+        return task
+
+    def _untrack( self, task: asyncio.Task[ bytes ] ):
+        self.background_tasks.discard( task )
+        if not task.cancelled() and task.exception() is not None:
+            LOG.debug( f'Background TTS request failed: {task.exception()!r}' )
+
+    async def _synthesize( self, backend: TTSBackend, request: TTSRequest ) -> bytes:
+        start = time.perf_counter()
+        audio_content = await backend.synthesize( request )
+        TTS_BACKEND_LATENCY.observe( time.perf_counter() - start, backend=backend.name )
+        return audio_content
+
+    def _in_flight_done( self, key: tuple[ str, TTSRequest ], future: asyncio.Future[ bytes ] ):
+        if self.in_flight.get( key ) is future:
+            del self.in_flight[ key ]
+        if not future.cancelled() and future.exception() is not None:
+            LOG.debug( f'Shared TTS request failed: {future.exception()!r}' )
+
+    async def _generate( self, backend: TTSBackend, request: TTSRequest ) -> bytes:
+        key = ( backend.name, request )
+        future = self.in_flight.get( key )
+        if future is not None:
+            self.deduplicated += 1
+        else:
+            future = self.in_flight[ key ] = asyncio.ensure_future( self._generate_cached( backend, request ) )
+            future.add_done_callback( lambda f: self._in_flight_done( key, f ) )
+
+        return await asyncio.shield( future )
+
+    async def _generate_cached( self, backend: TTSBackend, request: TTSRequest ) -> bytes:
+        if self.cache is None:
+            return await self._synthesize( backend, request )
+
+        cache_key = tts_cache_key(
+            request.text,
+            ssml=request.ssml,
+            language_code=request.language_code,
+            voice_name=request.voice_name,
+            pitch=request.pitch,
+            speed=request.speed,
+            encoding=backend.encoding,
+            backend=backend.name,
+        )
+
+        audio_content = await self.cache.get( cache_key )
+        if audio_content is not None:
+            LOG.debug( f'TTS cache hit ({backend.name}): "{request.text}"' )
+            return audio_content
+
+        audio_content = await self._synthesize( backend, request )
+
+        await self.cache.put( cache_key, audio_content )
+
+        return audio_content
+
+if __name__ == '__main__':
     async def main():
         import argparse
 
@@ -44,6 +279,12 @@ if __name__ == '__main__':
         def _path_arg( arg: str ) -> Path:
             return Path( arg ).resolve().absolute()
 
+        backends = {
+            GoogleTTSBackend.name: GoogleTTSBackend,
+            EspeakTTSBackend.name: EspeakTTSBackend,
+            FakeTTSBackend.name: FakeTTSBackend,
+        }
+
         parser = argparse.ArgumentParser()
         text_group = parser.add_mutually_exclusive_group( required=True )
         text_group.add_argument( '--text' )
@@ -52,13 +293,21 @@ if __name__ == '__main__':
         parser.add_argument( '--voice', default='en-US-Wavenet-F' )
         parser.add_argument( '--pitch', type=float )
         parser.add_argument( '--speed', type=float )
+        parser.add_argument( '--backend', choices=backends, default=GoogleTTSBackend.name )
         parser.add_argument( '--output', required=True, type=_path_arg )
         args = parser.parse_args()
 
-        tts = TTS()
+        tts = TTS( backend=backends[ args.backend ]() )
 
-        audio_content = await tts.generate_tts( args.text, language_code=args.lang, voice_name=args.voice, pitch=args.pitch, speed=args.speed )
+        audio_content = await tts.generate_tts(
+            args.ssml or args.text,
+            ssml=args.ssml is not None,
+            language_code=args.lang,
+            voice_name=args.voice,
+            pitch=args.pitch,
+            speed=args.speed,
+        )
 
         args.output.write_bytes( audio_content )
 
-    asyncio.run( main() )
\ No newline at end of file
+    asyncio.run( main() )
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from collections import OrderedDict
+from pathlib import Path
+
+LOG = logging.getLogger( __name__ )
+
+DEFAULT_MAX_MEMORY_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+def tts_cache_key( text: str, *, ssml: bool, language_code: str, voice_name: str, pitch: float | None, speed: float | None, encoding: str, backend: str ) -> str:
+    key_data = json.dumps( [ backend, text, ssml, language_code, voice_name, pitch, speed, encoding ], ensure_ascii=False )
+    return hashlib.sha256( key_data.encode( 'utf-8' ) ).hexdigest()
+
+class TTSCache:
+    def __init__( self, cache_dir: Path | None, max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES ) -> None:
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self.memory: OrderedDict[ str, bytes ] = OrderedDict()
+        self.memory_bytes = 0
+
+        self.disk_index: OrderedDict[ str, int ] | None = None
+        self.disk_bytes = 0
+        self.disk_lock = asyncio.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def hits( self ) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def _disk_path( self, key: str ) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / key[ :2 ] / f'{key}.bin'
+
+    def _remember( self, key: str, audio_content: bytes ):
+        if len( audio_content ) > self.max_memory_bytes:
+            return
+
+        previous = self.memory.pop( key, None )
+        if previous is not None:
+            self.memory_bytes -= len( previous )
+
+        self.memory[ key ] = audio_content
+        self.memory_bytes += len( audio_content )
+
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem( last=False )
+            self.memory_bytes -= len( evicted )
+
+    def _load_disk_index( self ) -> OrderedDict[ str, int ]:
+        assert self.cache_dir is not None
+
+        entries: list[ tuple[ float, str, int ] ] = []
+        if self.cache_dir.is_dir():
+            for path in self.cache_dir.glob( '*/*.bin' ):
+                stat = path.stat()
+                entries.append( ( stat.st_mtime, path.stem, stat.st_size ) )
+
+        return OrderedDict( ( key, size ) for _, key, size in sorted( entries ) )
+
+    def _read_disk( self, key: str ) -> bytes | None:
+        path = self._disk_path( key )
+        try:
+            audio_content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        os.utime( path )
+        return audio_content
+
+    def _write_disk( self, key: str, audio_content: bytes, evict_keys: list[ str ] ):
+        path = self._disk_path( key )
+        path.parent.mkdir( parents=True, exist_ok=True )
+
+        tmp_path = path.with_suffix( '.tmp' )
+        tmp_path.write_bytes( audio_content )
+        os.replace( tmp_path, path )
+
+        for evict_key in evict_keys:
+            self._disk_path( evict_key ).unlink( missing_ok=True )
+
+    async def _ensure_disk_index( self ) -> OrderedDict[ str, int ]:
+        if self.disk_index is None:
+            self.disk_index = await asyncio.to_thread( self._load_disk_index )
+            self.disk_bytes = sum( self.disk_index.values() )
+            LOG.debug( f'Loaded TTS disk cache index: {len( self.disk_index )} entries, {self.disk_bytes} bytes' )
+
+        return self.disk_index
+
+    async def get( self, key: str ) -> bytes | None:
+        audio_content = self.memory.get( key )
+        if audio_content is not None:
+            self.memory_hits += 1
+            self.memory.move_to_end( key )
+            return audio_content
+
+        if self.cache_dir is not None:
+            async with self.disk_lock:
+                disk_index = await self._ensure_disk_index()
+                if key in disk_index:
+                    audio_content = await asyncio.to_thread( self._read_disk, key )
+                    if audio_content is None:
+                        self.disk_bytes -= disk_index.pop( key )
+                    else:
+                        disk_index.move_to_end( key )
+
+            if audio_content is not None:
+                self.disk_hits += 1
+                self._remember( key, audio_content )
+                return audio_content
+
+        self.misses += 1
+        return None
+
+    async def put( self, key: str, audio_content: bytes ):
+        self._remember( key, audio_content )
+
+        if self.cache_dir is None or len( audio_content ) > self.max_disk_bytes:
+            return
+
+        async with self.disk_lock:
+            disk_index = await self._ensure_disk_index()
+
+            if key in disk_index:
+                self.disk_bytes -= disk_index.pop( key )
+
+            disk_index[ key ] = len( audio_content )
+            self.disk_bytes += len( audio_content )
+
+            evict_keys: list[ str ] = []
+            while self.disk_bytes > self.max_disk_bytes:
+                evict_key, evict_size = disk_index.popitem( last=False )
+                self.disk_bytes -= evict_size
+                evict_keys.append( evict_key )
+
+            try:
+                await asyncio.to_thread( self._write_disk, key, audio_content, evict_keys )
+            except Exception as ex:
+                LOG.warning( f'Failed to write TTS cache entry: {key}', exc_info=ex )
+                self.disk_bytes -= disk_index.pop( key, 0 )
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+
+import discord
+
+from discord.ext import commands
+
+from metrics import VOICE_HANDSHAKE_LATENCY
+
+LOG = logging.getLogger( __name__ )
+
+DEFAULT_IDLE_TIMEOUT = 5 * 60
+DEFAULT_MAX_CONCURRENT_HANDSHAKES = 4
+JOIN_LATENCY_HISTORY = 100
+MOVE_TIMEOUT = 10.0
+MOVE_POLL_INTERVAL = 0.05
+
+VoiceChannel = discord.VoiceChannel | discord.StageChannel
+
+class VoiceConnectionManager:
+    def __init__( self, bot: commands.Bot, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, max_concurrent_handshakes: int = DEFAULT_MAX_CONCURRENT_HANDSHAKES ) -> None:
+        self.bot = bot
+        self.idle_timeout = idle_timeout
+
+        self.guild_locks: dict[ int, asyncio.Lock ] = {}
+        self.handshakes = asyncio.Semaphore( max_concurrent_handshakes )
+        self.idle_disconnects: dict[ int, asyncio.Task[ None ] ] = {}
+
+        self.join_latencies: deque[ float ] = deque( maxlen=JOIN_LATENCY_HISTORY )
+        self.reused_connections = 0
+
+    def get_voice_client( self, guild: discord.Guild ) -> discord.VoiceClient | None:
+        voice_client = guild.voice_client
+        if isinstance( voice_client, discord.VoiceClient ):
+            return voice_client
+        return None
+
+    def _is_connected_to( self, voice_client: discord.VoiceClient | None, channel: VoiceChannel ) -> bool:
+        return voice_client is not None and voice_client.is_connected() and voice_client.channel == channel
+
+    async def _move( self, voice_client: discord.VoiceClient, channel: VoiceChannel ):
+        await voice_client.move_to( channel )
+
+        async def wait_for_move():
+            while voice_client.channel != channel:
+                await asyncio.sleep( MOVE_POLL_INTERVAL )
+
+        await asyncio.wait_for( wait_for_move(), timeout=MOVE_TIMEOUT )
+
+    def _cancel_idle_disconnect( self, guild_id: int ):
+        task = self.idle_disconnects.pop( guild_id, None )
+        if task is not None:
+            task.cancel()
+
+    async def connect( self, channel: VoiceChannel ) -> discord.VoiceClient:
+        guild = channel.guild
+        self._cancel_idle_disconnect( guild.id )
+
+        voice_client = self.get_voice_client( guild )
+        if self._is_connected_to( voice_client, channel ):
+            assert voice_client is not None
+            self.reused_connections += 1
+            return voice_client
+
+        lock = self.guild_locks.setdefault( guild.id, asyncio.Lock() )
+        async with lock:
+            voice_client = self.get_voice_client( guild )
+            if self._is_connected_to( voice_client, channel ):
+                assert voice_client is not None
+                self.reused_connections += 1
+                return voice_client
+
+            start = time.perf_counter()
+
+            async with self.handshakes:
+                if voice_client is not None and voice_client.is_connected():
+                    LOG.info( f'Moving voice connection in guild ({guild.name} - {guild.id}) to channel ({channel.name} - {channel.id})' )
+                    await self._move( voice_client, channel )
+                else:
+                    if voice_client is not None:
+                        await voice_client.disconnect( force=True )
+
+                    LOG.info( f'Connecting to voice channel ({channel.name} - {channel.id}) in guild ({guild.name} - {guild.id})' )
+                    voice_client = await channel.connect( self_mute=False, self_deaf=True )
+
+            join_latency = time.perf_counter() - start
+            self.join_latencies.append( join_latency )
+            VOICE_HANDSHAKE_LATENCY.observe( join_latency )
+            LOG.debug( f'Voice connection ready for channel ({channel.name} - {channel.id}) in {join_latency:.3f}s' )
+
+            return voice_client
+
+    def release( self, channel: VoiceChannel ):
+        guild = channel.guild
+
+        voice_client = self.get_voice_client( guild )
+        if not self._is_connected_to( voice_client, channel ) or guild.id in self.idle_disconnects:
+            return
+
+        self.idle_disconnects[ guild.id ] = asyncio.create_task( self._idle_disconnect( channel ) )
+
+    async def _idle_disconnect( self, channel: VoiceChannel ):
+        try:
+            await asyncio.sleep( self.idle_timeout )
+        finally:
+            if self.idle_disconnects.get( channel.guild.id ) is asyncio.current_task():
+                del self.idle_disconnects[ channel.guild.id ]
+
+        voice_client = self.get_voice_client( channel.guild )
+        if not self._is_connected_to( voice_client, channel ):
+            return
+        assert voice_client is not None
+
+        if any( not m.bot for m in channel.members ) or voice_client.is_playing():
+            return
+
+        LOG.info( f'Idle voice connection detected, disconnecting from channel ({channel.name} - {channel.id})' )
+        await voice_client.disconnect()